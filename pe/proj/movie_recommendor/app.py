@@ -9,88 +9,247 @@ id,title,type,genres,averageRating,numVotes,releaseYear
 Usage:
     pip install pandas scikit-learn
     python movie_recommender_imdb.py
+    python movie_recommender_imdb.py batch --ratings ratings.db --out recs.csv
+    python movie_recommender_imdb.py serve --port 8765
+    python movie_recommender_imdb.py synth --rows 1e6 --out imdb.csv --users 1000
+    python movie_recommender_imdb.py tune --classifier rf --folds 5 [--search grid]
+    python movie_recommender_imdb.py bench --sizes 1e4,1e5 [--save-baseline]
 
 Features:
-- Parse multi-genre strings (comma-separated)
+- Parse multi-genre strings (comma-separated) into a sparse genre matrix
 - User rates movies (like/dislike)
-- Train DecisionTreeClassifier or RandomForestClassifier on user's ratings
-- Recommend unwatched movies by predicted probability of "like"
-- Persist ratings in user_ratings.json
+- Train DecisionTreeClassifier or RandomForestClassifier on user's ratings,
+  or an online SGD model that is updated in place after every new rating
+- Recommend unwatched movies by predicted probability of "like", re-ranking
+  a cheap pre-scored shortlist instead of the whole catalog
+- "More like this": nearest titles by feature similarity through an
+  approximate (IVF) index, with no training
+- Collaborative filtering: ALS factors trained once over every user in the
+  ratings database, with new ratings folded in at query time
+- Persist ratings in user_ratings.json plus an append-only user_ratings.jsonl
+  journal, and trained models keyed by those ratings
+- Cache the cleaned catalog as .npy columns next to imdb.csv for fast restarts
+- Tune classifier settings by cross-validated grid/random search; the
+  chosen settings are saved and used for every later fit
+- Re-train the selected classifier in the background after each rating, so
+  recommendations are ready when asked for
+- Show the menu at once: heavy libraries import lazily and the catalog loads
+  on a background thread; options that need it wait until it is ready
 """
 
 import os
 import json
 import sys
+import argparse
+import atexit
+import hashlib
+import time
+import tracemalloc
+import threading
 from textwrap import dedent
 
-import pandas as pd
-from sklearn.preprocessing import MultiLabelBinarizer, StandardScaler
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.model_selection import train_test_split
+STARTED = time.perf_counter()  # for time-to-first-prompt
+
+import numpy as np
+
+from lazy import LazyModule
+
+import catalog_cache
+import instrument
+from title_index import TitleIndex
+from fuzzy import FuzzyMatcher
+from scoring import ScoringPool, score_candidates
+from ratings_store import RatingsJournal, SqliteRatingsStore
+from rec_cache import REC_CACHE_FILE, RecommendationCache
+from similarity import N_PROBE, SimilarityIndex
+from cf import ALSModel
+from retrieval import RETRIEVAL_CANDIDATES, shortlist, retrieval_recall
+
+# pandas, scipy and scikit-learn load on first use so the menu comes up at once
+pd = LazyModule('pandas')
+sp = LazyModule('scipy.sparse')
+sklearn = LazyModule('sklearn')
 
 MOVIES_CSV = "imdb.csv"            # change if your file name differs
 RATINGS_FILE = "user_ratings.json" # persisted user ratings
+RATINGS_BACKEND = "json"  # "json" (single user, journaled file) or "sqlite" (multi-user)
+RATINGS_DB = "ratings.db"  # SQLite database used by the "sqlite" backend
+DEFAULT_USER = "default"  # user id when none is given
+RATINGS_LISTENERS = []  # callables run as callback(ratings, user_id) after every save
 
 # Config
 MIN_VOTES = 0  # filter out very obscure titles if you want (set to 0 to disable)
 ALLOWED_TYPE = "movie"  # keep only rows where type == 'movie' (if present)
 RECOMMEND_TOP_N = 10
+ONLINE_EPOCHS = 5  # passes over existing ratings when the online model is first built
+ONLINE_CLASSES = np.array([0, 1])
+CLASSIFIER_NAMES = {'rf': 'RandomForest', 'dt': 'DecisionTree', 'sgd': 'Online SGD'}
+MENU_CLASSIFIERS = {'5': 'rf', '6': 'dt', '10': 'sgd'}
+INGEST_CHUNK_ROWS = 500_000  # rows parsed per chunk when reading the CSV
+FUZZY_MAX_DISTANCE = 2  # max typos tolerated when no title contains the query
+SCORE_BLOCK_ROWS = 200_000  # candidate rows scored per predict_proba call
+SCORE_WORKERS = 1  # processes used to score blocks (1 = score in this process)
+SPARSE_FEATURES = True  # keep the genre/feature matrix in CSR form end to end
+FEATURES_VERSION = 1  # bump when build_features() output changes, to drop stale feature caches
+MODEL_VERSION = 1  # bump when train_model() changes, to drop stale saved models
+MODEL_PARAMS_FILE = "model_params.json"  # classifier settings chosen by `tune`, used by train_model()
+DEFAULT_PARAMS = {  # classifier settings when none have been tuned
+    'rf': {'n_estimators': 100, 'class_weight': 'balanced'},
+    'dt': {'max_depth': 6},
+}
+PRETRAIN_DELAY = 1.0  # seconds without a new rating before the menu re-trains in the background (None = off)
+REPORT_INGEST_MEMORY = False  # print the tracemalloc peak whenever the CSV is parsed (set by --report-memory)
 
-def load_movies(csv_path=MOVIES_CSV):
+@instrument.stage('load_movies')
+def load_movies(csv_path=MOVIES_CSV, use_cache=True, report_memory=None):
+    # report_memory=None follows REPORT_INGEST_MEMORY; a cache hit parses nothing and reports nothing
+    if report_memory is None:
+        report_memory = REPORT_INGEST_MEMORY
     if not os.path.exists(csv_path):
         print(f"Error: {csv_path} not found. Put imdb.csv in the same directory.")
         sys.exit(1)
-    df = pd.read_csv(csv_path, low_memory=False)
-    # Normalize column names if needed
-    df = df.rename(columns={
-        'title': 'title',
-        'genres': 'genres',
-        'averageRating': 'imdb',
-        'numVotes': 'numVotes',
-        'releaseYear': 'year',
-        'type': 'type'
-    })
+    if not use_cache:
+        return read_movies_csv(csv_path, report_memory=report_memory)
+    cache_dir = catalog_cache.cache_dir_for(csv_path)
+    key = catalog_key(csv_path)
+    df = catalog_cache.load_frame(cache_dir, key)
+    if df is None:
+        df = read_movies_csv(csv_path, report_memory=report_memory)
+        try:
+            catalog_cache.save_frame(df, cache_dir, key)
+        except OSError as e:
+            print(f"Warning: could not write catalog cache ({e}).")
+    # derived caches (features, indexes) are stored alongside under the same key
+    df.attrs['catalog_key'] = key
+    df.attrs['cache_dir'] = cache_dir
+    return df
+
+def catalog_key(csv_path=MOVIES_CSV):
+    # cache is keyed by the CSV fingerprint and the filters applied while cleaning
+    return catalog_cache.csv_fingerprint(csv_path, extra={'type': ALLOWED_TYPE, 'min_votes': MIN_VOTES})
+
+# raw CSV column -> internal name, and the compact dtype each is stored as
+CSV_COLUMNS = {
+    'title': 'title',
+    'type': 'type',
+    'genres': 'genres',
+    'averageRating': 'imdb',
+    'numVotes': 'numVotes',
+    'releaseYear': 'year',
+}
+NUMERIC_DTYPES = {'imdb': 'float32', 'numVotes': 'int32', 'year': 'int32'}
+
+def _clean_chunk(chunk):
+    # Normalize column names and filter a single CSV chunk
+    chunk = chunk.rename(columns=CSV_COLUMNS)
     # Keep movies only (if type column exists)
-    if 'type' in df.columns:
-        df = df[df['type'].fillna('').str.lower() == ALLOWED_TYPE]
+    if 'type' in chunk.columns:
+        types = chunk['type'].astype(str).str.lower()
+        chunk = chunk[types.to_numpy() == ALLOWED_TYPE]
+    for col in ('imdb', 'numVotes', 'year'):
+        if col in chunk.columns:
+            chunk[col] = pd.to_numeric(chunk[col], errors='coerce').astype('float32')
     # Filter by votes to reduce noise (optional)
-    if 'numVotes' in df.columns:
-        df = df[df['numVotes'].fillna(0) >= MIN_VOTES]
-
-    
-    # Keep necessary columns and drop duplicates
+    if 'numVotes' in chunk.columns:
+        chunk = chunk[chunk['numVotes'].fillna(0) >= MIN_VOTES]
     want_cols = ['title', 'genres', 'imdb', 'numVotes', 'year']
-    available = [c for c in want_cols if c in df.columns]
-    df = df[available].drop_duplicates(subset=['title']).reset_index(drop=True)
-    # Clean fields
+    chunk = chunk[[c for c in want_cols if c in chunk.columns]]
+    if 'genres' in chunk.columns:
+        chunk['genres'] = chunk['genres'].astype('category')
+    return chunk
+
+def read_movies_csv(csv_path=MOVIES_CSV, chunksize=INGEST_CHUNK_ROWS, report_memory=False):
+    """Stream the CSV in chunks, reading only the needed columns with compact dtypes."""
+    # leave tracemalloc alone if something (e.g. --profile) is already tracing
+    report_memory = report_memory and not tracemalloc.is_tracing()
+    if report_memory:
+        tracemalloc.start()
+    reader = pd.read_csv(
+        csv_path,
+        usecols=lambda c: c in CSV_COLUMNS,
+        dtype={'title': str, 'type': 'category', 'genres': str},
+        na_values=['\\N'],
+        chunksize=chunksize,
+    )
+    chunks = [_clean_chunk(chunk) for chunk in reader]
+    chunks = [c for c in chunks if not c.empty] or chunks[:1]
+
+    # Per-chunk categories differ, so merge them before concatenating
+    genres = None
+    if chunks and 'genres' in chunks[0].columns:
+        from pandas.api.types import union_categoricals
+        genres = union_categoricals([c.pop('genres') for c in chunks])
+    df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=['title'])
+    if genres is not None:
+        df.insert(1, 'genres', genres)
+    del chunks
+
+    # Clean fields and drop duplicates
     df['title'] = df['title'].astype(str).str.strip()
-    df['genres'] = df['genres'].fillna('').astype(str)
-    # Normalize imdb to numeric
+    df = df.drop_duplicates(subset=['title']).reset_index(drop=True)
+    if 'genres' in df.columns:
+        if '' not in df['genres'].cat.categories:
+            df['genres'] = df['genres'].cat.add_categories([''])
+        df['genres'] = df['genres'].fillna('')
+    else:
+        df['genres'] = pd.Categorical([''] * len(df))
     if 'imdb' in df.columns:
-        df['imdb'] = pd.to_numeric(df['imdb'], errors='coerce').fillna(df['imdb'].mean())
-    if 'year' in df.columns:
-        df['year'] = pd.to_numeric(df['year'], errors='coerce').fillna(0).astype(int)
-    if 'numVotes' in df.columns:
-        df['numVotes'] = pd.to_numeric(df['numVotes'], errors='coerce').fillna(0).astype(int)
+        df['imdb'] = df['imdb'].fillna(df['imdb'].mean()).astype(NUMERIC_DTYPES['imdb'])
+    for col in ('year', 'numVotes'):
+        if col in df.columns:
+            df[col] = df[col].fillna(0).astype(NUMERIC_DTYPES[col])
     if 'numVotes' in df.columns and 'year' in df.columns:
-        df['popularity'] = df.groupby('year')['numVotes'].transform(
-            lambda x: (x - x.mean()) / (x.std() + 1e-9)
-        )
+        votes = df.groupby('year')['numVotes']
+        # a year with a single title has no spread; call it average (0) rather than NaN
+        df['popularity'] = ((df['numVotes'] - votes.transform('mean'))
+                            / (votes.transform('std') + 1e-9)).fillna(0).astype('float32')
+
+    if report_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        final = df.memory_usage(deep=True).sum()
+        print(f"Loaded {len(df):,} titles: peak {peak / 2**20:.1f} MiB during ingest, "
+              f"{final / 2**20:.1f} MiB final frame.")
     return df
 
-def search_movie(title_query, df, max_results=100):
+def open_title_index(df):
+    # trigram index over df's titles, persisted with the catalog cache
+    return TitleIndex.open(df['title'].tolist(), df.attrs.get('cache_dir'), df.attrs.get('catalog_key'))
+
+def open_fuzzy_matcher(index, df):
+    # typo-tolerant matcher over index, its deletion index persisted with the catalog cache
+    return FuzzyMatcher.open(index, FUZZY_MAX_DISTANCE, df.attrs.get('cache_dir'), df.attrs.get('catalog_key'))
+
+def search_movie(title_query, df, max_results=100, index=None):
     """Return a list of close matches for partial movie titles."""
+    if index is not None:
+        # ranked lookup: exact, prefix, word-start, then other matches; popular first
+        weights = df['numVotes'].to_numpy() if 'numVotes' in df.columns else None
+        rows = index.search(title_query, k=max_results, weights=weights)
+        return df.iloc[rows].reset_index(drop=True)
     title_query = title_query.lower().strip()
     matches = df[df['title'].str.lower().str.contains(title_query, na=False)]
     return matches.head(max_results).reset_index(drop=True)
 
 
-def select_movie_from_search(df):
+def fuzzy_search(title_query, df, matcher, k=10, max_distance=FUZZY_MAX_DISTANCE, partial=True):
+    """Return the k titles closest to title_query within max_distance edits."""
+    weights = df['numVotes'].to_numpy() if 'numVotes' in df.columns else None
+    found = matcher.match(title_query, k=k, max_distance=max_distance, partial=partial, weights=weights)
+    matches = df.iloc[[row for row, _ in found]].reset_index(drop=True)
+    matches['distance'] = [dist for _, dist in found]
+    return matches
+
+
+def select_movie_from_search(df, index=None, matcher=None):
     """Interactive helper for fuzzy title search + selection."""
     query = input("Enter (partial) movie title: ").strip()
-    matches = search_movie(query, df)
+    matches = search_movie(query, df, index=index)
 
+    if matches.empty and matcher is not None:
+        matches = fuzzy_search(query, df, matcher)
+        if not matches.empty:
+            print(f"No exact matches; showing titles within {FUZZY_MAX_DISTANCE} typos.")
     if matches.empty:
         print("No matches found.")
         return None
@@ -110,17 +269,85 @@ def select_movie_from_search(df):
 
 
 
-def parse_genres(df):
+def split_genres(genres):
     # Genres come like "Action, Adventure" or "Drama" or ""
-    lists = df['genres'].apply(lambda s: [g.strip() for g in s.split(',') if g.strip()]) 
+    def split(s):
+        return [g.strip() for g in str(s).split(',') if g.strip()]
+    if isinstance(genres.dtype, pd.CategoricalDtype):
+        # split each distinct genre string once, then expand by code
+        cats = [split(c) for c in genres.cat.categories]
+        return [cats[c] if c >= 0 else [] for c in genres.cat.codes.to_numpy()]
+    return [split(s) for s in genres.fillna('')]
+
+@instrument.stage('parse_genres')
+def parse_genres(df):
+    lists = split_genres(df['genres'])
+    from sklearn.preprocessing import MultiLabelBinarizer
     mlb = MultiLabelBinarizer(sparse_output=False)
     genre_mat = mlb.fit_transform(lists)
     genre_df = pd.DataFrame(genre_mat, columns=[f"genre__{g}" for g in mlb.classes_])
     return genre_df, mlb
 
-def build_features(df, mlb=None, scaler=None, fit_scaler=True):
+def genre_matrix(genres, mlb=None):
+    """CSR genre indicator matrix (float32) and the fitted MultiLabelBinarizer."""
+    if not isinstance(genres.dtype, pd.CategoricalDtype):
+        genres = genres.fillna('').astype(str).astype('category')
+    # binarize each distinct genre string once, then gather rows by code
+    cats = split_genres(pd.Series(genres.cat.categories.astype(str).tolist() + ['']))
+    if mlb is None:
+        from sklearn.preprocessing import MultiLabelBinarizer
+        mlb = MultiLabelBinarizer(sparse_output=True)
+        mlb.fit(cats)
+    mlb.sparse_output = True  # the same binarizer may be reused by the dense path
+    cat_mat = sp.csr_matrix(mlb.transform(cats), dtype=np.float32)
+    codes = genres.cat.codes.to_numpy().copy()
+    codes[codes < 0] = len(cats) - 1
+    return cat_mat[codes], mlb
+
+
+class FeatureMatrix:
+    """
+    Sparse model inputs for the catalog: one CSR row per title, in df order.
+    X holds exactly the columns train_model() feeds the classifier.
+    """
+
+    def __init__(self, X, titles, columns):
+        self.X = X
+        self.titles = np.asarray(titles, dtype=object)
+        self.columns = list(columns)
+
+    def __len__(self):
+        return self.X.shape[0]
+
+
+def build_sparse_features(df, mlb=None, scaler=None, fit_scaler=True):
+    # Same columns and scaling as build_features(), but never densified
+    genre_mat, mlb_fitted = genre_matrix(df['genres'], mlb)
+    numeric_cols = [c for c in ['imdb', 'year', 'numVotes', 'popularity'] if c in df.columns]
+    num = df[numeric_cols].to_numpy(dtype=np.float64) if numeric_cols else np.empty((len(df), 0))
+
+    scaler_fitted = scaler
+    if fit_scaler:
+        from sklearn.preprocessing import StandardScaler
+        scaler_fitted = StandardScaler()
+        if numeric_cols:
+            num = scaler_fitted.fit_transform(num)
+    elif scaler_fitted and numeric_cols:
+        num = scaler_fitted.transform(num)
+    # numVotes is scaled with the others but, as in train_model(), not a model input
+    keep = [i for i, c in enumerate(numeric_cols) if c != 'numVotes']
+    X = sp.hstack([sp.csr_matrix(num[:, keep].astype(np.float32)), genre_mat], format='csr')
+    columns = [numeric_cols[i] for i in keep] + [f"genre__{g}" for g in mlb_fitted.classes_]
+    return FeatureMatrix(X, df['title'].to_numpy(), columns), mlb_fitted, scaler_fitted
+
+@instrument.stage('build_features')
+def build_features(df, mlb=None, scaler=None, fit_scaler=True, sparse=False):
     # returns feature DataFrame and fitted scaler/mlb (if applicable)
-    genre_df, mlb_fitted = parse_genres(df) if mlb is None else (pd.DataFrame(mlb.transform(df['genres'].apply(lambda s: [g.strip() for g in s.split(',') if g.strip()])) , columns=[f"genre__{g}" for g in mlb.classes_]), mlb)
+    if sparse:
+        return build_sparse_features(df, mlb=mlb, scaler=scaler, fit_scaler=fit_scaler)
+    if mlb is not None:
+        mlb.sparse_output = False
+    genre_df, mlb_fitted = parse_genres(df) if mlb is None else (pd.DataFrame(mlb.transform(split_genres(df['genres'])) , columns=[f"genre__{g}" for g in mlb.classes_]), mlb)
     feats = pd.concat([df.reset_index(drop=True), genre_df.reset_index(drop=True)], axis=1)
 
     numeric_cols = []
@@ -130,6 +357,7 @@ def build_features(df, mlb=None, scaler=None, fit_scaler=True):
 
     scaler_fitted = scaler
     if fit_scaler:
+        from sklearn.preprocessing import StandardScaler
         scaler_fitted = StandardScaler()
         if numeric_cols:
             feats[numeric_cols] = scaler_fitted.fit_transform(feats[numeric_cols])
@@ -140,106 +368,387 @@ def build_features(df, mlb=None, scaler=None, fit_scaler=True):
     feats = feats.drop(columns=['genres'])
     return feats, mlb_fitted, scaler_fitted
 
-def load_ratings():
-    if os.path.exists(RATINGS_FILE):
-        with open(RATINGS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
+_journals = {}
+
+def ratings_journal(path=None):
+    # one journal per ratings file, flushed at interpreter exit
+    path = os.path.abspath(path or RATINGS_FILE)
+    if path not in _journals:
+        _journals[path] = RatingsJournal(path)
+        atexit.register(_journals[path].close)
+    return _journals[path]
+
+_sqlite_stores = {}
+
+def ratings_db(path=None):
+    # one shared connection per database file
+    path = os.path.abspath(path or RATINGS_DB)
+    if path not in _sqlite_stores:
+        _sqlite_stores[path] = SqliteRatingsStore(path)
+        atexit.register(_sqlite_stores[path].close)
+    return _sqlite_stores[path]
+
+def _use_db(user_id):
+    return user_id is not None or RATINGS_BACKEND == 'sqlite'
 
-def save_ratings(ratings):
-    with open(RATINGS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(ratings, f, indent=2, ensure_ascii=False)
+def load_ratings(user_id=None):
+    if _use_db(user_id):
+        return ratings_db().load(user_id or DEFAULT_USER)
+    return ratings_journal().load()
 
-def train_model(features_df, ratings_dict, classifier='rf'):
+def save_ratings(ratings, user_id=None):
+    # full rewrite: snapshot the whole dict and reset the journal
+    if _use_db(user_id):
+        ratings_db().replace(user_id or DEFAULT_USER, ratings)
+    else:
+        ratings_journal().compact(ratings)
+    for callback in RATINGS_LISTENERS:
+        callback(ratings, user_id)
+
+def save_rating(ratings, title, value, user_id=None):
+    """Record a single rating: updates ratings in place and appends one journal line (or row)."""
+    ratings[title] = value
+    if _use_db(user_id):
+        ratings_db().record(user_id or DEFAULT_USER, title, value)
+    else:
+        ratings_journal().record(title, value)
+    for callback in RATINGS_LISTENERS:
+        callback(ratings, user_id)
+
+class FeatureStore:
+    """
+    Catalog features built once per catalog version, kept in memory and
+    persisted next to the catalog cache. Rows are served by title.
+    """
+
+    def __init__(self, features, mlb, scaler):
+        self.features = features
+        self.mlb = mlb
+        self.scaler = scaler
+        # title -> catalog row, built once; replaces per-title boolean scans
+        self.row_of = {t: i for i, t in enumerate(feature_titles(features))}
+
+    @classmethod
+    def open(cls, df, sparse=SPARSE_FEATURES):
+        """Load the store for df's catalog from disk, building and saving it on a miss."""
+        cache_dir = df.attrs.get('cache_dir')
+        key = df.attrs.get('catalog_key')
+        if key:
+            key = f"{key}:{FEATURES_VERSION}:{'sparse' if sparse else 'dense'}"
+            store = cls.load(df, cache_dir, key, sparse)
+            if store is not None:
+                return store
+        features, mlb, scaler = build_features(df, mlb=None, scaler=None, fit_scaler=True, sparse=sparse)
+        store = cls(features, mlb, scaler)
+        if key:
+            try:
+                store.save(cache_dir, key)
+            except OSError as e:
+                print(f"Warning: could not write feature cache ({e}).")
+        return store
+
+    @classmethod
+    def load(cls, df, cache_dir, key, sparse):
+        found = catalog_cache.load_arrays(cache_dir, key, name='features')
+        if found is None:
+            return None
+        arrays, objects = found
+        if sparse:
+            X = sp.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']),
+                              shape=tuple(arrays['shape']))
+            features = FeatureMatrix(X, df['title'].to_numpy(), objects['columns'])
+        else:
+            features = catalog_cache.load_frame(cache_dir, key, name='features.dense')
+            if features is None:
+                return None
+        return cls(features, objects['mlb'], objects['scaler'])
+
+    def save(self, cache_dir, key):
+        objects = {'mlb': self.mlb, 'scaler': self.scaler}
+        if isinstance(self.features, FeatureMatrix):
+            X = self.features.X
+            arrays = {'data': X.data, 'indices': X.indices, 'indptr': X.indptr, 'shape': np.array(X.shape)}
+            objects['columns'] = self.features.columns
+        else:
+            catalog_cache.save_frame(self.features, cache_dir, key, name='features.dense')
+            arrays = {}
+        catalog_cache.save_arrays(arrays, cache_dir, key, name='features', objects=objects)
+
+    def positions(self, titles):
+        # catalog row positions (ascending) of the titles present in the store
+        return np.array(sorted(self.row_of[t] for t in titles if t in self.row_of), dtype=np.int64)
+
+    def rows(self, titles):
+        """Classifier inputs for the given titles, in catalog order."""
+        return model_inputs(self.features, self.positions(titles))
+
+
+def feature_titles(features):
+    # title per feature row, for a feature DataFrame, FeatureMatrix or FeatureStore
+    if isinstance(features, FeatureStore):
+        features = features.features
+    if isinstance(features, FeatureMatrix):
+        return features.titles
+    return features['title'].to_numpy()
+
+def model_inputs(features, rows):
+    # classifier input matrix for the selected rows (boolean mask or positions)
+    if isinstance(features, FeatureStore):
+        features = features.features
+    if isinstance(features, FeatureMatrix):
+        return features.X[np.asarray(rows)]
+    subset = features[np.asarray(rows)] if np.asarray(rows).dtype == bool else features.iloc[rows]
+    drop_cols = ['title', 'numVotes'] if 'numVotes' in subset.columns else ['title']
+    return subset.drop(columns=drop_cols).values
+
+def feature_columns(features):
+    # names of the catalog_matrix() columns
+    if isinstance(features, FeatureStore):
+        features = features.features
+    if isinstance(features, FeatureMatrix):
+        return features.columns
+    return [c for c in features.columns if c not in ('title', 'numVotes')]
+
+def catalog_matrix(features):
+    # classifier inputs for every catalog row (CSR matrix or dense array)
+    if isinstance(features, FeatureStore):
+        features = features.features
+    if isinstance(features, FeatureMatrix):
+        return features.X
+    return model_inputs(features, np.arange(len(features)))
+
+@instrument.stage('train_model', rows=lambda result, args, kwargs: len(result[2]) if result[2] is not None else 0)
+def train_model(features_df, ratings_dict=None, classifier='rf', user_id=None, params=None):
     # Build training X,y from features_df using ratings_dict: title -> 0/1
-    rated_rows = features_df[features_df['title'].isin(ratings_dict.keys())].copy()
-    if rated_rows.empty:
+    # (or the stored ratings of user_id when no dict is given)
+    if ratings_dict is None:
+        ratings_dict = load_ratings(user_id)
+    X, y = training_data(features_df, ratings_dict)
+    if X is None:
         return None, None, None
-    y = rated_rows['title'].map(ratings_dict).astype(int).values
-    X = rated_rows.drop(columns=['title', 'numVotes'] if 'numVotes' in rated_rows.columns else ['title']).values
-    # choice of classifier
+    if params is None:
+        params = model_params(classifier)
+    return fit_classifier(X, y, classifier, params), X, y
+
+def training_data(features_df, ratings_dict):
+    # (X, y) for the rated titles found in the catalog, in catalog order; (None, None) if none are
+    titles = feature_titles(features_df)
+    if isinstance(features_df, FeatureStore):
+        rated_rows = features_df.positions(ratings_dict.keys())
+    else:
+        rated_rows = np.flatnonzero(pd.Series(titles).isin(ratings_dict.keys()).to_numpy())
+    if len(rated_rows) == 0:
+        return None, None
+    y = np.array([ratings_dict[t] for t in titles[rated_rows]], dtype=int)
+    return model_inputs(features_df, rated_rows), y
+
+def model_params(classifier, path=MODEL_PARAMS_FILE):
+    """Settings for classifier: DEFAULT_PARAMS, overridden by any saved by `tune`."""
+    params = dict(DEFAULT_PARAMS.get(classifier, {}))
+    if path and os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            params.update(saved.get(classifier, {}).get('params', {}))
+        except (OSError, json.JSONDecodeError, AttributeError) as e:
+            print(f"Warning: ignoring unreadable {path} ({e}).")
+    return params
+
+def fit_classifier(X, y, classifier='rf', params=None):
+    # choice of classifier; params default to DEFAULT_PARAMS (the online model takes none)
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.linear_model import SGDClassifier
+    from sklearn.tree import DecisionTreeClassifier
+    if params is None:
+        params = DEFAULT_PARAMS.get(classifier, {})
     if classifier == 'rf':
-        clf = RandomForestClassifier(n_estimators=100, random_state=42, class_weight='balanced')
+        clf = RandomForestClassifier(random_state=42, **params)
+    elif classifier == 'sgd':
+        # online learner: a few shuffled passes now, then one partial_fit per new rating
+        clf = SGDClassifier(loss='log_loss', random_state=42)
+        rng = np.random.default_rng(42)
+        for _ in range(ONLINE_EPOCHS):
+            order = rng.permutation(len(y))
+            clf.partial_fit(X[order], y[order], classes=ONLINE_CLASSES)
+        return clf
     else:
-        clf = DecisionTreeClassifier(max_depth=6, random_state=42)
+        clf = DecisionTreeClassifier(random_state=42, **params)
     clf.fit(X, y)
-    return clf, X, y
+    return clf
+
+def update_model(clf, features, title, liked):
+    """Absorb one new rating into an online ('sgd') model without revisiting history."""
+    if isinstance(features, FeatureStore):
+        rows = features.positions([title])
+    else:
+        rows = np.flatnonzero(feature_titles(features) == title)[:1]
+    if len(rows) == 0:
+        return clf
+    clf.partial_fit(model_inputs(features, rows), np.array([int(liked)]), classes=ONLINE_CLASSES)
+    return clf
 
+def ratings_fingerprint(ratings):
+    # stable hash of a title -> 0/1 ratings dict
+    payload = json.dumps(ratings, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
 
+def model_key(df, ratings, classifier):
+    # saved models are only valid for the same catalog, features, settings, ratings and sklearn
+    catalog = df.attrs.get('catalog_key')
+    if not catalog:
+        return None
+    return ':'.join([catalog, str(FEATURES_VERSION), str(MODEL_VERSION), sklearn.__version__,
+                     classifier, ratings_fingerprint(model_params(classifier)), ratings_fingerprint(ratings)])
 
-import numpy as np
+def save_model(df, store, ratings, classifier, clf):
+    key = model_key(df, ratings, classifier)
+    if key is None:
+        return
+    objects = {'clf': clf, 'mlb': store.mlb, 'scaler': store.scaler}
+    try:
+        catalog_cache.save_arrays({}, df.attrs['cache_dir'], key, name=f"model.{classifier}", objects=objects)
+    except OSError as e:
+        print(f"Warning: could not save model ({e}).")
 
-def recommend(df, clf, feats_df, ratings_dict, top_n=RECOMMEND_TOP_N):
-    # Determine unwatched movies
-    unwatched_mask = ~df['title'].isin(ratings_dict.keys())
-    if not unwatched_mask.any():
-        return []
+def load_model(df, ratings, classifier):
+    """Return the saved classifier for exactly these ratings, or None."""
+    key = model_key(df, ratings, classifier)
+    if key is None:
+        return None
+    found = catalog_cache.load_arrays(df.attrs['cache_dir'], key, name=f"model.{classifier}")
+    return found[1]['clf'] if found is not None else None
 
-    candidates = feats_df[unwatched_mask].copy()
-    if candidates.empty:
-        return []
+def catalog_version(df):
+    # everything besides the ratings and classifier settings that a recommendation list depends on
+    return f"{df.attrs.get('catalog_key')}:{FEATURES_VERSION}:{MODEL_VERSION}"
 
-    # Prepare feature matrix for candidates (drop non-feature cols)
-    drop_cols = ['title']
-    if 'numVotes' in candidates.columns:
-        drop_cols.append('numVotes')
-    X_cand = candidates.drop(columns=drop_cols).values
-
-    # Get probability of "like" (class 1) robustly
-    prob_like = None
-    if hasattr(clf, 'predict_proba'):
-        proba = clf.predict_proba(X_cand)  # shape (n_samples, n_classes)
-        classes = getattr(clf, "classes_", None)
-
-        if classes is None:
-            # Fallback: if no classes_ attribute, use predict output
-            preds = clf.predict(X_cand)
-            prob_like = preds.astype(float)
-        else:
-            # If both classes are present, find column index of class 1
-            if 1 in classes:
-                idx1 = int(list(classes).index(1))
-                # safe indexing
-                if proba.shape[1] > idx1:
-                    prob_like = proba[:, idx1]
-                else:
-                    # fallback - should not normally happen, but handle gracefully
-                    prob_like = np.zeros(len(X_cand))
-            else:
-                # single-class (only 0 or only other label) case
-                # If classifier was trained only on class 0 -> prob_like = 0
-                # If trained only on class something else (e.g., only 1), handle accordingly
-                single_class = classes[0]
-                if single_class == 1:
-                    prob_like = np.ones(len(X_cand))
-                else:
-                    prob_like = np.zeros(len(X_cand))
+def settings_fingerprint(classifier):
+    # stable hash of the settings train_model() would use for classifier
+    return ratings_fingerprint(model_params(classifier))
+
+def get_model(df, store, ratings, classifier='rf'):
+    # load the model saved for these ratings, or train and save one
+    clf = load_model(df, ratings, classifier)
+    if clf is None:
+        clf, _, _ = train_model(store, ratings, classifier=classifier)
+        if clf is not None:
+            save_model(df, store, ratings, classifier, clf)
+    return clf
+
+
+@instrument.stage('recommend')
+def recommend(df, clf, feats_df, ratings_dict, top_n=RECOMMEND_TOP_N,
+              block_size=SCORE_BLOCK_ROWS, workers=SCORE_WORKERS, pool=None,
+              candidates=RETRIEVAL_CANDIDATES):
+    # Determine unwatched movies (via the store's title -> row index when available)
+    if isinstance(feats_df, FeatureStore):
+        unwatched_mask = np.ones(len(feats_df.row_of), dtype=bool)
+        unwatched_mask[feats_df.positions(ratings_dict.keys())] = False
     else:
-        # classifier doesn't support predict_proba -> fallback to predict
-        preds = clf.predict(X_cand)
-        prob_like = preds.astype(float)
+        unwatched_mask = ~df['title'].isin(ratings_dict.keys()).to_numpy()
+    if not unwatched_mask.any():
+        return []
 
-    # Insert probabilities and sort
-    candidates = candidates.reset_index(drop=True)
-    candidates['prob_like'] = prob_like
-    recs = candidates.sort_values('prob_like', ascending=False).head(top_n)
+    # Score candidates block by block (optionally across worker processes
+    # sharing one copy of the feature matrix), keeping only a running top_n
+    candidate_rows = np.flatnonzero(unwatched_mask)
+    X_all = catalog_matrix(feats_df)
+    if candidates:
+        # two-stage: a cheap genre/rating/popularity pre-score keeps the best
+        # `candidates` titles and only those are re-ranked by clf
+        if isinstance(feats_df, FeatureStore):
+            liked = feats_df.positions(t for t, v in ratings_dict.items() if v == 1)
+            disliked = feats_df.positions(t for t, v in ratings_dict.items() if v == 0)
+        else:
+            titles_all = df['title']
+            liked = np.flatnonzero(titles_all.isin([t for t, v in ratings_dict.items() if v == 1]).to_numpy())
+            disliked = np.flatnonzero(titles_all.isin([t for t, v in ratings_dict.items() if v == 0]).to_numpy())
+        candidate_rows = shortlist(X_all, feature_columns(feats_df), candidate_rows, liked, disliked, n=candidates)
+    instrument.set_rows(len(candidate_rows))  # rows actually scored, not the catalog size
+    rows, prob_like = score_candidates(clf, X_all, candidate_rows, top_n,
+                                       block_size=block_size, workers=workers, pool=pool)
 
+    # feature rows line up with df rows, so hydrate by position instead of by title
+    titles = df['title'].to_numpy()[rows]
+    imdb = df['imdb'].to_numpy()[rows] if 'imdb' in df.columns else [None] * len(rows)
+    year = df['year'].to_numpy()[rows] if 'year' in df.columns else [None] * len(rows)
     out = []
-    for _, row in recs.iterrows():
-        title = row['title']
-        # use original df to get the true values
-        orig = df[df['title'] == title].iloc[0]
+    for title, p, r, yr in zip(titles, prob_like, imdb, year):
         out.append({
             'title': title,
-            'prob_like': float(row['prob_like']),
-            'imdb': round(float(orig['imdb']),2) if 'imdb' in orig else None,
-            'year': int(orig['year']) if 'year' in orig else None
+            'prob_like': float(p),
+            'imdb': round(float(r),2) if r is not None else None,
+            'year': int(yr) if yr is not None else None
         })
 
     # print(feats_df.describe(include='all'))
     return out
 
 
+def open_similarity_index(df, store):
+    # IVF index over the store's feature rows, persisted with the feature cache
+    key = df.attrs.get('catalog_key')
+    if key:
+        key = f"{key}:{FEATURES_VERSION}:{'sparse' if isinstance(store.features, FeatureMatrix) else 'dense'}"
+    return SimilarityIndex.open(catalog_matrix(store), df.attrs.get('cache_dir'), key)
+
+def similar_movies(df, store, titles, top_n=RECOMMEND_TOP_N, index=None, n_probe=N_PROBE, exclude=()):
+    # titles most like the given ones by cosine similarity of their feature rows; no training
+    rows = store.positions(titles)
+    if len(rows) == 0:
+        return []
+    if index is None:
+        index = open_similarity_index(df, store)
+    hits, sims = index.search(catalog_matrix(store), rows, k=top_n, n_probe=n_probe,
+                              exclude=store.positions(exclude))
+    imdb = df['imdb'].to_numpy() if 'imdb' in df.columns else None
+    year = df['year'].to_numpy() if 'year' in df.columns else None
+    titles_col = df['title'].to_numpy()
+    return [{
+        'title': titles_col[r],
+        'similarity': float(s),
+        'imdb': round(float(imdb[r]), 2) if imdb is not None else None,
+        'year': int(year[r]) if year is not None else None,
+    } for r, s in zip(hits, sims)]
+
+
+def open_cf_model(df, triples):
+    # ALS factors for every user's (user_id, title, value) ratings, saved with the catalog cache
+    return ALSModel.open(triples, titles=set(df['title']), cache_dir=df.attrs.get('cache_dir'),
+                         catalog_key=df.attrs.get('catalog_key'))
+
+def cf_recommend(df, store, model, ratings=None, top_n=RECOMMEND_TOP_N, user_id=None):
+    # top titles by predicted preference: the trained vector of user_id, or the
+    # given ratings folded in (new users, or ratings changed since training)
+    u = model.user_vector(user_id) if ratings is None else model.fold_in(ratings)
+    if u is None or not np.any(u):
+        return []  # unknown user, or none of their titles were rated by anyone else
+    # never suggest what the user has already rated
+    rated = model.rated_titles(user_id) if ratings is None else ratings.keys()
+    titles, scores = model.recommend(u, k=top_n, exclude=rated)
+    rows = [store.row_of[t] for t in titles]
+    imdb = df['imdb'].to_numpy()[rows] if 'imdb' in df.columns else [None] * len(rows)
+    year = df['year'].to_numpy()[rows] if 'year' in df.columns else [None] * len(rows)
+    return [{
+        'title': t,
+        'score': float(sc),
+        'imdb': round(float(r), 2) if r is not None else None,
+        'year': int(yr) if yr is not None else None,
+    } for t, sc, r, yr in zip(titles, scores, imdb, year)]
+
+
+def measure_retrieval(df, clf, store, ratings, top_n=RECOMMEND_TOP_N, candidates=RETRIEVAL_CANDIDATES):
+    # recall and latency of the two-stage pipeline against the full scan
+    started = time.perf_counter()
+    full = recommend(df, clf, store, ratings, top_n=top_n, candidates=0)
+    full_s = time.perf_counter() - started
+    started = time.perf_counter()
+    two_stage = recommend(df, clf, store, ratings, top_n=top_n, candidates=candidates)
+    two_stage_s = time.perf_counter() - started
+    return {'recall': retrieval_recall(full, two_stage), 'full_ms': full_s * 1000,
+            'two_stage_ms': two_stage_s * 1000, 'candidates': candidates}
+
+
 def sample_for_rating(df, k=20):
     # return a small random sample of popular movies for user to rate
     # prefer higher numVotes and recent
@@ -250,11 +759,165 @@ def sample_for_rating(df, k=20):
         sample = df.sample(n=min(k, len(df)), random_state=42)
     return sample.reset_index(drop=True)
 
+class CatalogLoader:
+    """
+    Loads the catalog, feature store and title indexes on a background
+    thread so the menu can be shown straight away; wait() blocks until
+    they are ready.
+    """
+
+    def __init__(self, csv_path=MOVIES_CSV, sparse=SPARSE_FEATURES):
+        self.csv_path = csv_path
+        self.sparse = sparse
+        self.df = self.store = self.title_idx = self.matcher = self.rec_cache = None
+        self.error = None
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self._load, name='catalog-loader', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _load(self):
+        try:
+            df = load_movies(self.csv_path)
+            # catalog features are built once (or loaded from disk) and reused by every retrain
+            store = FeatureStore.open(df, sparse=self.sparse)
+            title_idx = open_title_index(df)
+            cache_dir = df.attrs.get('cache_dir')
+            self.rec_cache = RecommendationCache(os.path.join(cache_dir, REC_CACHE_FILE) if cache_dir else None)
+            self.df, self.store, self.title_idx = df, store, title_idx
+            self.matcher = open_fuzzy_matcher(title_idx, df)
+        except BaseException as e:  # includes the SystemExit of a missing CSV
+            self.error = e
+        finally:
+            self.ready.set()
+
+    def wait(self):
+        if not self.ready.is_set():
+            print("Loading catalog...", flush=True)
+            self.ready.wait()
+        if self.error is not None:
+            raise self.error
+        return self
+
+
+class BackgroundTrainer:
+    """
+    Re-fits the menu's selected classifier on a background thread whenever
+    the ratings are saved, so options 5/6 find the model and its
+    recommendations ready. Ratings saved within `delay` seconds of each
+    other are fitted once; a finished fit replaces the previous one in a
+    single assignment.
+    """
+
+    def __init__(self, loader, classifier='rf', delay=PRETRAIN_DELAY, top_n=RECOMMEND_TOP_N):
+        self.loader = loader
+        self.classifier = classifier  # fitted on the next change; the menu sets it to the last one used
+        self.delay = delay
+        self.top_n = top_n
+        self.latest = None    # (fit key, clf, recs) of the last finished fit
+        self.busy = None      # fit key being fitted now
+        self.error = None
+        self._pending = None  # (fit key, ratings copy) waiting out the delay
+        self._due = 0.0
+        self._changed = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name='background-trainer', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    @staticmethod
+    def fit_key(classifier, ratings):
+        # a fit is reusable only for the same classifier, settings and ratings
+        return (classifier, settings_fingerprint(classifier), ratings_fingerprint(ratings))
+
+    def notify(self, ratings, user_id=None):
+        """RATINGS_LISTENERS callback: schedule a fit on a copy of the ratings, restarting the delay."""
+        snapshot = dict(ratings)
+        key = self.fit_key(self.classifier, snapshot)
+        with self._changed:
+            self._pending = (key, snapshot)
+            self._due = time.monotonic() + self.delay
+            self._changed.notify_all()
+
+    def _run(self):
+        while True:
+            with self._changed:
+                while self._pending is None or time.monotonic() < self._due:
+                    self._changed.wait(None if self._pending is None else self._due - time.monotonic())
+                key, ratings = self._pending
+                self._pending = None
+                self.busy = key
+            result = None
+            try:
+                clf, recs = self._fit(key[0], ratings)
+                if clf is not None:
+                    result = (key, clf, recs)
+            except Exception as e:  # the menu falls back to fitting in the foreground
+                self.error = e
+            finally:
+                with self._changed:
+                    if result is not None:
+                        self.latest = result
+                    self.busy = None
+                    self._changed.notify_all()
+
+    def _fit(self, classifier, ratings):
+        self.loader.ready.wait()
+        if self.loader.error is not None:
+            return None, None
+        df, store = self.loader.df, self.loader.store
+        clf = get_model(df, store, ratings, classifier=classifier)
+        if clf is None:
+            return None, None
+        # scored in this thread; the menu's scoring pool is not shared
+        return clf, recommend(df, clf, store, ratings, top_n=self.top_n, workers=1)
+
+    def result(self, classifier, ratings):
+        """
+        (clf, recs) fitted on exactly these ratings and settings, or None. A matching fit
+        that is pending or under way is finished first rather than repeated.
+        """
+        wanted = self.fit_key(classifier, ratings)
+        with self._changed:
+            if self._pending is not None and self._pending[0] == wanted:
+                self._due = 0.0  # asked for now: skip the rest of the delay
+                self._changed.notify_all()
+            while self.busy == wanted or (self._pending is not None and self._pending[0] == wanted):
+                self._changed.wait()
+            if self.latest is not None and self.latest[0] == wanted:
+                return self.latest[1:]
+        return None
+
+
+# options that need the catalog, features or indexes to be loaded first
+CATALOG_OPTIONS = {'1', '2', '3', '5', '6', '10', '11', '12'}
+
 def interactive_menu():
-    df = load_movies()
+    loader = CatalogLoader().start()
     ratings = load_ratings()
+    df = store = title_idx = matcher = rec_cache = pool = None
+
+    # a new ratings snapshot makes this file's older cached lists unreachable; drop them
+    if RATINGS_BACKEND == 'sqlite':
+        ratings_source = f"{os.path.abspath(RATINGS_DB)}#{DEFAULT_USER}"
+    else:
+        ratings_source = os.path.abspath(RATINGS_FILE)
+
+    def invalidate_cached(r, user_id):
+        if loader.rec_cache is not None:
+            loader.rec_cache.invalidate(ratings_source, ratings_fingerprint(r))
+    RATINGS_LISTENERS.append(invalidate_cached)
 
-    feats, mlb, scaler = build_features(df, mlb=None, scaler=None, fit_scaler=True)
+    # re-fit after every rating so options 5/6 answer without a visible fit
+    trainer = None
+    if PRETRAIN_DELAY is not None:
+        trainer = BackgroundTrainer(loader).start()
+        RATINGS_LISTENERS.append(trainer.notify)
+        if ratings:
+            trainer.notify(ratings)
 
     menu = dedent("""
     ===== IMDb CLI Recommender =====
@@ -264,16 +927,32 @@ def interactive_menu():
     4) Show my ratings
     5) Train & Recommend (RandomForest)
     6) Train & Recommend (DecisionTree)
+    10) Recommend (Online SGD, updated on every rating)
+    11) More like my liked movies (no training)
+    12) Recommend from other users' ratings (ALS collaborative filtering)
     7) Export recommendations CSV (after training)
     8) Clear ratings
     9) Exit
     """).strip()
 
     last_recs = []
+    online_clf = None  # built on first use of option 10, then updated per rating
+    sim_index = None  # built or loaded on first use of option 11
+    cf_model = None  # trained or loaded on first use of option 12; my ratings are folded in
+    first_prompt = True
 
     while True:
         print("\n" + menu)
-        choice = input("Choose option [1-9]: ").strip()
+        if first_prompt:
+            instrument.record('first prompt', time.perf_counter() - STARTED, cpu_s=time.process_time())
+            first_prompt = False
+        choice = input("Choose option [1-12]: ").strip()
+        if choice in CATALOG_OPTIONS and df is None:
+            loader.wait()
+            df, store, title_idx, matcher, rec_cache = (
+                loader.df, loader.store, loader.title_idx, loader.matcher, loader.rec_cache)
+            # scoring workers attach to the feature matrix once and are reused by every request
+            pool = ScoringPool(catalog_matrix(store), SCORE_WORKERS) if SCORE_WORKERS > 1 else None
         if choice == '1':
             print("\nRandom movie titles (sampled):")
             # Shuffle the dataframe rows randomly each time
@@ -291,19 +970,21 @@ def interactive_menu():
                 print(f"{i+1:2d}. {row['title']} — {row.get('imdb', 'N/A')} — {row.get('year', '')}")
         elif choice == '3':
             # title = input("Enter exact movie title to rate: ").strip()
-            title = select_movie_from_search(df)
+            title = select_movie_from_search(df, index=title_idx, matcher=matcher)
             if not title:
                 print("Cancelled or not found.")
                 continue
-            if title not in df['title'].values:
+            if title not in store.row_of:
                 print("Title not found (try option 2 to view a sample). Exact match needed.")
                 continue
             val = input("Like this movie? (y/n): ").strip().lower()
             if val not in ('y', 'n'):
                 print("Use 'y' for like, 'n' for dislike.")
                 continue
-            ratings[title] = 1 if val == 'y' else 0
-            save_ratings(ratings)
+            save_rating(ratings, title, 1 if val == 'y' else 0)
+            if online_clf is not None:
+                online_clf = update_model(online_clf, store, title, ratings[title])
+                save_model(df, store, ratings, 'sgd', online_clf)
             print(f"Saved rating: {title} -> {ratings[title]}")
         elif choice == '4':
             if not ratings:
@@ -312,25 +993,75 @@ def interactive_menu():
                 print("\nYour ratings:")
                 for t, v in ratings.items():
                     print(f"- {t}: {'Liked' if v==1 else 'Disliked'}")
-        elif choice in ('5', '6'):
-            clf_type = 'rf' if choice == '5' else 'dt'
-            # rebuild features with same mlb/scaler objects to avoid mismatch
-            feats_df, _, _ = build_features(df, mlb=mlb, scaler=scaler, fit_scaler=False)
-            clf, X, y = train_model(feats_df, ratings, classifier='rf' if clf_type == 'rf' else 'dt')
-            if clf is None:
-                print("No rated movies found. Rate at least a few (5-10) movies first.")
-                continue
-            recs = recommend(df, clf, feats_df, ratings, top_n=RECOMMEND_TOP_N)
+        elif choice in MENU_CLASSIFIERS:
+            clf_type = MENU_CLASSIFIERS[choice]
+            cache_args = (ratings_source, ratings_fingerprint(ratings), clf_type, RECOMMEND_TOP_N,
+                          f"{catalog_version(df)}:{RETRIEVAL_CANDIDATES}:{settings_fingerprint(clf_type)}")
+            if trainer is not None and clf_type != 'sgd':
+                trainer.classifier = clf_type  # later ratings re-fit this one
+            recs = rec_cache.get(*cache_args)
+            if recs is None:
+                pretrained = trainer.result(clf_type, ratings) if trainer is not None else None
+                if pretrained is not None:
+                    clf, recs = pretrained
+                elif clf_type == 'sgd' and online_clf is not None:
+                    clf = online_clf  # already up to date with every rating
+                else:
+                    clf = get_model(df, store, ratings, classifier=clf_type)
+                    if clf_type == 'sgd':
+                        online_clf = clf
+                if clf is None:
+                    print("No rated movies found. Rate at least a few (5-10) movies first.")
+                    continue
+                if recs is None:
+                    recs = recommend(df, clf, store, ratings, top_n=RECOMMEND_TOP_N, pool=pool)
+                rec_cache.put(*cache_args, recs)
             if not recs:
                 print("No recommendations (maybe you rated all sample movies).")
             else:
-                print(f"\nTop {len(recs)} recommendations (using {'RandomForest' if clf_type=='rf' else 'DecisionTree'}):")
+                print(f"\nTop {len(recs)} recommendations (using {CLASSIFIER_NAMES[clf_type]}):")
                 for i, r in enumerate(recs, 1):
                     print(f"{i}. {r['title']} — IMDb: {r['imdb']} — Year: {r['year']} — Prob_like: {r['prob_like']:.3f}")
                 last_recs = recs
+        elif choice == '11':
+            liked = [t for t, v in ratings.items() if v == 1]
+            if not liked:
+                print("No liked movies yet; pick one to find similar titles.")
+                title = select_movie_from_search(df, index=title_idx, matcher=matcher)
+                if not title or title not in store.row_of:
+                    print("Cancelled or not found.")
+                    continue
+                liked = [title]
+            if sim_index is None:
+                sim_index = open_similarity_index(df, store)
+            recs = similar_movies(df, store, liked, top_n=RECOMMEND_TOP_N, index=sim_index, exclude=ratings.keys())
+            if not recs:
+                print("No similar titles found.")
+            else:
+                print(f"\nTop {len(recs)} titles like {len(liked)} liked movie(s):")
+                for i, r in enumerate(recs, 1):
+                    print(f"{i}. {r['title']} — IMDb: {r['imdb']} — Year: {r['year']} — Similarity: {r['similarity']:.3f}")
+                last_recs = recs
+        elif choice == '12':
+            if not ratings:
+                print("No rated movies found. Rate at least a few (5-10) movies first.")
+                continue
+            if cf_model is None:
+                if not os.path.exists(RATINGS_DB):
+                    print(f"No multi-user ratings database ({RATINGS_DB}) to learn from.")
+                    continue
+                cf_model = open_cf_model(df, ratings_db().all_ratings())
+            recs = cf_recommend(df, store, cf_model, ratings, top_n=RECOMMEND_TOP_N)
+            if not recs:
+                print("No recommendations (none of your rated titles were rated by other users).")
+            else:
+                print(f"\nTop {len(recs)} recommendations (ALS over {len(cf_model.user_ids):,} users):")
+                for i, r in enumerate(recs, 1):
+                    print(f"{i}. {r['title']} — IMDb: {r['imdb']} — Year: {r['year']} — Score: {r['score']:.3f}")
+                last_recs = recs
         elif choice == '7':
             if not last_recs:
-                print("No cached recommendations. Run option 5 or 6 first.")
+                print("No cached recommendations. Run option 5, 6, 10, 11 or 12 first.")
             else:
                 out_df = pd.DataFrame(last_recs)
                 out_df.to_csv("recommendations.csv", index=False)
@@ -340,12 +1071,105 @@ def interactive_menu():
             if confirm == 'y':
                 ratings = {}
                 save_ratings(ratings)
+                online_clf = None
                 print("Ratings cleared.")
         elif choice == '9':
             print("Goodbye.")
+            if pool is not None:
+                pool.close()
             break
         else:
-            print("Invalid option. Choose 1-9.")
+            print("Invalid option. Choose 1-12.")
+
+def main(argv=None):
+    global REPORT_INGEST_MEMORY
+    parser = argparse.ArgumentParser(description="IMDb CLI movie recommender.")
+    parser.add_argument('--profile', metavar='JSONL',
+                        help="record per-stage timings to a JSON-lines file ('-' = stdout) "
+                             "and print a summary table on exit")
+    parser.add_argument('--profile-no-memory', action='store_true',
+                        help="with --profile, skip tracemalloc peaks (lower overhead)")
+    parser.add_argument('--report-memory', action='store_true',
+                        help="print the peak memory of parsing the catalog CSV (on a cache miss)")
+    sub = parser.add_subparsers(dest='command')
+    batch = sub.add_parser('batch', help="write top-N recommendations for many users")
+    batch.add_argument('--ratings', required=True,
+                       help="ratings source: SQLite .db, CSV/JSONL (user_id,title,value) or JSON")
+    batch.add_argument('--out', required=True, help="output .csv or .parquet file")
+    batch.add_argument('--csv', default=MOVIES_CSV, help="IMDb catalog CSV")
+    batch.add_argument('--classifier', choices=sorted(CLASSIFIER_NAMES) + ['als'], default='rf',
+                       help="per-user classifier, or 'als' to factorize all users' ratings at once")
+    batch.add_argument('--top-n', type=int, default=RECOMMEND_TOP_N)
+    batch.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    batch.add_argument('--block-size', type=int, default=SCORE_BLOCK_ROWS)
+    batch.add_argument('--candidates', type=int, default=RETRIEVAL_CANDIDATES,
+                       help="titles pre-scored into each user's shortlist (0 = score every title)")
+    serve = sub.add_parser('serve', help="run the local HTTP recommendation service")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--csv', default=MOVIES_CSV, help="IMDb catalog CSV")
+    serve.add_argument('--workers', type=int, default=4, help="threads for training/scoring")
+    synth = sub.add_parser('synth', help="write a synthetic IMDb catalog (and rating set)")
+    synth.add_argument('--rows', type=float, required=True, help="titles to generate, e.g. 1e6")
+    synth.add_argument('--out', default=MOVIES_CSV, help="catalog CSV to write")
+    synth.add_argument('--users', type=int, default=0, help="also write ratings for this many users")
+    synth.add_argument('--per-user', type=int, default=50, help="ratings per synthetic user")
+    synth.add_argument('--ratings-out', default="synthetic_ratings.csv")
+    synth.add_argument('--seed', type=int, default=0)
+    bench = sub.add_parser('bench', help="time the pipeline on synthetic catalogs")
+    bench.add_argument('--sizes', default="10000,100000", help="comma-separated catalog sizes, e.g. 1e4,1e5,1e6")
+    bench.add_argument('--work-dir', default=".bench", help="where synthetic catalogs are kept")
+    bench.add_argument('--baseline', default="bench_baseline.json")
+    bench.add_argument('--save-baseline', action='store_true', help="store this run as the baseline")
+    bench.add_argument('--repeat', type=int, default=3, help="runs per stage; the best is kept")
+    bench.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown vs the baseline")
+    bench.add_argument('--no-memory', action='store_true', help="skip the tracemalloc pass")
+    tune = sub.add_parser('tune', help="cross-validate classifier settings on a user's ratings")
+    tune.add_argument('--classifier', choices=['rf', 'dt'], default='rf')
+    tune.add_argument('--csv', default=MOVIES_CSV, help="IMDb catalog CSV")
+    tune.add_argument('--user', help="user id in the ratings database (default: this directory's ratings)")
+    tune.add_argument('--folds', type=int, default=5, help="cross-validation folds")
+    tune.add_argument('--search', choices=['grid', 'random'], default='random',
+                      help="every combination of the search space, or --iter sampled ones")
+    tune.add_argument('--iter', type=int, default=20, help="configurations tried by random search")
+    tune.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    tune.add_argument('--seed', type=int, default=0)
+    tune.add_argument('--out', default=MODEL_PARAMS_FILE, help="where the chosen settings are saved")
+    tune.add_argument('--dry-run', action='store_true', help="report results without saving them")
+    args = parser.parse_args(argv)
+    if args.profile:
+        instrument.enable(args.profile, memory=not args.profile_no_memory)
+    if args.report_memory:
+        REPORT_INGEST_MEMORY = True
+
+    if args.command == 'batch':
+        from batch import run_batch
+        run_batch(args.ratings, args.out, csv_path=args.csv, classifier=args.classifier,
+                  top_n=args.top_n, workers=args.workers, block_size=args.block_size,
+                  candidates=args.candidates)
+    elif args.command == 'serve':
+        from server import run
+        run(args.host, args.port, csv_path=args.csv, workers=args.workers)
+    elif args.command == 'synth':
+        from synth import generate_catalog, generate_ratings
+        generate_catalog(int(args.rows), args.out, seed=args.seed)
+        print(f"Wrote {int(args.rows):,} synthetic titles to {args.out}")
+        if args.users:
+            ratings = generate_ratings(load_movies(args.out), args.users, per_user=args.per_user, seed=args.seed)
+            ratings.to_csv(args.ratings_out, index=False)
+            print(f"Wrote {len(ratings):,} ratings from {args.users:,} users to {args.ratings_out}")
+    elif args.command == 'tune':
+        from tuning import run_tune
+        run_tune(args.classifier, csv_path=args.csv, user_id=args.user, folds=args.folds,
+                 search=args.search, n_iter=args.iter, workers=args.workers, seed=args.seed,
+                 out=args.out, save=not args.dry_run)
+    elif args.command == 'bench':
+        from benchmark import run_bench
+        run_bench([int(float(s)) for s in args.sizes.split(',')], work_dir=args.work_dir,
+                  baseline_path=args.baseline, save=args.save_baseline, repeat=args.repeat,
+                  memory=not args.no_memory, tolerance=args.tolerance)
+    else:
+        interactive_menu()
 
 if __name__ == "__main__":
-    interactive_menu()
+    main()
@@ -0,0 +1,174 @@
+"""
+batch.py
+Non-interactive recommendations for many users at once.
+
+    python app.py batch --ratings ratings.db --out recs.csv --workers 4
+
+The parent process loads the catalog and feature store once, turns every
+user's ratings into catalog row positions, and publishes the feature
+matrix with shared_matrix so pool workers attach to it without a copy.
+Workers only receive (user, rated rows, labels) and send back the row ids
+and probabilities of that user's top N; titles are filled in by the parent.
+
+Ratings sources: a SQLite ratings database (.db/.sqlite), a CSV or
+JSON-lines file with user_id,title,value columns, or a JSON file holding
+either one user's {title: value} dict or {user_id: {title: value}}.
+Output is CSV, or Parquet when --out ends in .parquet (needs pyarrow).
+
+With --classifier als the per-user classifiers are replaced by one ALS
+factorization of all users' ratings (cf.py); each user's list is then a
+dot product with the title factors, with a 'score' column instead of
+'prob_like'.
+"""
+
+import os
+import sys
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import app
+from scoring import score_candidates
+from retrieval import shortlist
+from shared_matrix import SharedMatrix, attach
+
+PROGRESS_EVERY = 100  # users between progress lines
+
+
+def read_ratings_source(path):
+    """user_id -> {title: 0/1} for every user in a ratings source."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.db', '.sqlite', '.sqlite3'):
+        users = {}
+        for user, title, value in app.SqliteRatingsStore(path).all_ratings():
+            users.setdefault(user, {})[title] = value
+        return users
+    if ext in ('.csv', '.jsonl'):
+        frame = pd.read_csv(path) if ext == '.csv' else pd.read_json(path, lines=True)
+        users = {}
+        for user, title, value in frame[['user_id', 'title', 'value']].itertuples(index=False):
+            users.setdefault(str(user), {})[title] = int(value)
+        return users
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if data and all(isinstance(v, dict) for v in data.values()):
+        return data
+    return {app.DEFAULT_USER: data}
+
+
+# per-process state for pool workers, set once by _init_worker
+_worker = {}
+
+
+def _init_worker(matrix_spec, classifier, top_n, block_size, columns, candidates, params):
+    X, segments = attach(matrix_spec)
+    _worker.update(X=X, segments=segments, classifier=classifier, top_n=top_n, block_size=block_size,
+                   columns=columns, candidates=candidates, params=params)
+
+
+def _recommend_user(task):
+    user, rows, y = task
+    w = _worker
+    return (user,) + recommend_rows(w['X'], rows, y, w['classifier'], w['top_n'], w['block_size'],
+                                    w['columns'], w['candidates'], w['params'])
+
+
+def recommend_rows(X, rows, y, classifier, top_n, block_size, columns=None, candidates=0, params=None):
+    # train on the rated rows and score the other rows (or their pre-scored
+    # shortlist when candidates is set); returns (rows, probs, rows scored)
+    clf = app.fit_classifier(X[rows], y, classifier, params)
+    unwatched = np.ones(X.shape[0], dtype=bool)
+    unwatched[rows] = False
+    candidate_rows = np.flatnonzero(unwatched)
+    if candidates:
+        candidate_rows = shortlist(X, columns, candidate_rows, rows[y == 1], rows[y == 0], n=candidates)
+    best, probs = score_candidates(clf, X, candidate_rows, top_n, block_size=block_size)
+    return best, probs, len(candidate_rows)
+
+
+def run_batch(ratings_path, out_path, csv_path=app.MOVIES_CSV, classifier='rf',
+              top_n=app.RECOMMEND_TOP_N, workers=1, block_size=app.SCORE_BLOCK_ROWS,
+              candidates=app.RETRIEVAL_CANDIDATES):
+    """Write top_n recommendations for every user in ratings_path to out_path."""
+    started = time.perf_counter()
+    df = app.load_movies(csv_path)
+    store = app.FeatureStore.open(df, sparse=app.SPARSE_FEATURES)
+    X = app.catalog_matrix(store)
+    columns = app.feature_columns(store)
+    users = read_ratings_source(ratings_path)
+    # the settings train_model() uses, so batch and the menu fit the same models
+    params = app.model_params(classifier)
+    print(f"Loaded {len(df):,} titles and {len(users):,} users in {time.perf_counter() - started:.1f}s.")
+
+    tasks, skipped = [], 0
+    for user, ratings in users.items():
+        rated = [(store.row_of[t], int(v)) for t, v in ratings.items() if t in store.row_of]
+        if not rated:
+            skipped += 1
+            continue
+        rated.sort()
+        tasks.append((user, np.array([r for r, _ in rated], dtype=np.int64),
+                      np.array([v for _, v in rated], dtype=int)))
+    if skipped:
+        print(f"Skipping {skipped:,} users with no ratings in this catalog.")
+
+    titles = df['title'].to_numpy()
+    imdb = df['imdb'].to_numpy() if 'imdb' in df.columns else None
+    year = df['year'].to_numpy() if 'year' in df.columns else None
+    out_rows = []
+    scored = [0]  # titles actually scored, summed over users
+    scoring_started = time.perf_counter()
+
+    score_col = 'score' if classifier == 'als' else 'prob_like'
+
+    def collect(user, rows, probs, n_scored, done):
+        scored[0] += n_scored
+        for rank, (row, p) in enumerate(zip(rows, probs), 1):
+            out_rows.append({
+                'user_id': user,
+                'rank': rank,
+                'title': titles[row],
+                score_col: float(p),
+                'imdb': round(float(imdb[row]), 2) if imdb is not None else None,
+                'year': int(year[row]) if year is not None else None,
+            })
+        if done % PROGRESS_EVERY == 0 or done == len(tasks):
+            elapsed = time.perf_counter() - scoring_started
+            print(f"[{done:,}/{len(tasks):,} users] {done / max(elapsed, 1e-9):.1f} users/s")
+
+    if classifier == 'als':
+        # one factorization over every user, then a dot product + top_n per user
+        model = app.open_cf_model(df, ((u, t, v) for u, r in users.items() for t, v in r.items()))
+        print(f"Trained ALS factors for {len(model.user_ids):,} users in {time.perf_counter() - scoring_started:.1f}s.")
+        scoring_started = time.perf_counter()
+        for done, (user, _, _) in enumerate(tasks, 1):
+            recs, scores = model.recommend(model.user_vector(user), k=top_n, exclude=users[user].keys())
+            collect(user, [store.row_of[t] for t in recs], scores, len(model.item_titles), done)
+    elif workers <= 1:
+        for done, (user, rows, y) in enumerate(tasks, 1):
+            collect(user, *recommend_rows(X, rows, y, classifier, top_n, block_size, columns, candidates, params),
+                    done)
+    else:
+        with SharedMatrix(X) as shared, ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker,
+                initargs=(shared.spec, classifier, top_n, block_size, columns, candidates, params)) as pool:
+            for done, result in enumerate(pool.map(_recommend_user, tasks, chunksize=4), 1):
+                collect(*result, done)
+
+    out = pd.DataFrame(out_rows, columns=['user_id', 'rank', 'title', score_col, 'imdb', 'year'])
+    if out_path.lower().endswith('.parquet'):
+        try:
+            out.to_parquet(out_path, index=False)
+        except ImportError as e:
+            print(f"Error: writing Parquet needs pyarrow or fastparquet ({e}).")
+            sys.exit(1)
+    else:
+        out.to_csv(out_path, index=False)
+    elapsed = time.perf_counter() - scoring_started
+    print(f"Wrote {len(out):,} recommendations for {len(tasks):,} users to {out_path} "
+          f"in {elapsed:.1f}s ({len(tasks) / max(elapsed, 1e-9):.1f} users/s, "
+          f"{scored[0] / max(elapsed, 1e-9):,.0f} titles scored/s).")
+    return out
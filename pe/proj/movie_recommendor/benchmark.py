@@ -0,0 +1,226 @@
+"""
+benchmark.py
+Time the recommender pipeline on synthetic catalogs.
+
+    python app.py bench --sizes 10000,100000,1000000
+    python app.py bench --sizes 100000 --save-baseline
+    python app.py bench --sizes 100000 --baseline bench_baseline.json
+
+For each catalog size a synthetic imdb.csv (synth.py) is generated once
+into the work directory and reused by later runs. Each stage is run
+`repeat` times and the best wall time is kept, then run once more under
+tracemalloc for its peak Python allocation:
+
+    load_movies (cold)   parse the CSV, no catalog cache
+    load_movies (warm)   read the .npy column cache
+    build_features       sparse feature matrix for the whole catalog
+    train_model          RandomForest on one synthetic user's ratings
+    recommend            score every unwatched title (two-stage and full scan)
+    search_movie         indexed substring search, per query
+
+It also launches the interactive menu against the largest catalog and
+times how long it takes to show its first prompt (budget: 200 ms).
+
+Results are printed as a table with throughput in items per second:
+catalog rows, except ratings for train_model, shortlisted titles for the
+two-stage recommend and queries for search_movie. With a baseline
+file, each stage is compared to the stored timing, and slowdowns beyond
+the tolerance are reported and make the command exit with status 1.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import subprocess
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+import app
+import synth
+
+WORK_DIR = ".bench"
+BASELINE_FILE = "bench_baseline.json"
+REPEAT = 3
+TOLERANCE = 0.25           # allowed slowdown over the baseline before it counts as a regression
+NOISE_FLOOR_SECONDS = 0.005  # differences below this are timer noise, never regressions
+RATINGS_PER_USER = 50
+SEARCH_QUERIES = 50
+STARTUP_BUDGET_MS = 200  # time from launching the menu to its first prompt
+
+
+def _measure(fn, repeat=REPEAT, memory=True):
+    # (best wall seconds over `repeat` runs, peak MiB of one traced run or None, last result)
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    peak = None
+    if memory:
+        # share a tracer that is already running (e.g. under --profile) instead of stopping it
+        owned = not tracemalloc.is_tracing()
+        if owned:
+            tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        try:
+            fn()
+            peak = (tracemalloc.get_traced_memory()[1] - start) / 2**20
+        finally:
+            if owned:
+                tracemalloc.stop()
+    return best, peak, result
+
+
+def catalog_path(rows, work_dir=WORK_DIR):
+    """Synthetic catalog of `rows` titles in work_dir, generated on first use."""
+    path = os.path.join(work_dir, f"imdb_{rows}.csv")
+    if not os.path.exists(path):
+        print(f"Generating {rows:,}-row synthetic catalog at {path} ...")
+        synth.generate_catalog(rows, path, seed=rows)
+    return path
+
+
+def bench_size(rows, work_dir=WORK_DIR, repeat=REPEAT, memory=True):
+    """{stage: {'seconds', 'peak_mib', 'rows', 'rows_per_s'}} for one catalog size."""
+    path = catalog_path(rows, work_dir)
+    results = {}
+
+    def record(stage, fn, n, reps=repeat):
+        seconds, peak, result = _measure(fn, reps, memory)
+        results[stage] = {'seconds': seconds, 'peak_mib': peak, 'rows': int(n),
+                          'rows_per_s': n / seconds if seconds > 0 else None}
+        return result
+
+    record('load_movies (cold)', lambda: app.load_movies(path, use_cache=False), rows, reps=1)
+    app.load_movies(path)  # make sure the column cache exists
+    df = record('load_movies (warm)', lambda: app.load_movies(path), rows)
+    record('build_features', lambda: app.build_features(df, sparse=True), len(df))
+
+    store = app.FeatureStore.open(df, sparse=True)
+    ratings_df = synth.generate_ratings(df, users=1, per_user=RATINGS_PER_USER, seed=rows)
+    ratings = dict(zip(ratings_df['title'], ratings_df['value'].astype(int)))
+    clf = record('train_model', lambda: app.train_model(store, ratings, classifier='rf')[0], len(ratings))
+    # the two-stage path only scores its shortlist of unwatched titles
+    shortlisted = min(app.RETRIEVAL_CANDIDATES, len(df) - len(store.positions(ratings)))
+    record('recommend', lambda: app.recommend(df, clf, store, ratings), shortlisted)
+    record('recommend (full scan)', lambda: app.recommend(df, clf, store, ratings, candidates=0), len(df))
+
+    index = app.open_title_index(df)
+    rng = np.random.default_rng(rows)
+    queries = [' '.join(rng.choice(synth.WORDS, size=rng.integers(1, 3))) for _ in range(SEARCH_QUERIES)]
+    record('search_movie', lambda: [app.search_movie(q, df, index=index) for q in queries], len(queries))
+    results['search_movie']['seconds_per_query'] = results['search_movie']['seconds'] / len(queries)
+    return results
+
+
+def time_to_first_prompt(cwd, runs=REPEAT):
+    """Best milliseconds from launching `python app.py` in cwd until the menu prompt appears."""
+    app_path = os.path.abspath(app.__file__)
+    best = float('inf')
+    for _ in range(runs):
+        started = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, app_path], cwd=cwd, stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        seen = b''
+        while b'Choose option' not in seen:
+            chunk = os.read(proc.stdout.fileno(), 4096)
+            if not chunk:
+                break
+            seen += chunk
+        if b'Choose option' in seen:
+            best = min(best, (time.perf_counter() - started) * 1000)
+        proc.communicate(b'9\n')
+    return best
+
+
+def environment():
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'sklearn': sklearn.__version__, 'machine': platform.machine(), 'cpus': os.cpu_count()}
+
+
+def load_baseline(path):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(path, report):
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp, path)
+
+
+def compare(report, baseline, tolerance=TOLERANCE):
+    """[(size, stage, baseline seconds, seconds, ratio)] for stages slower than the tolerance allows."""
+    regressions = []
+    for size, stages in report['sizes'].items():
+        base_stages = baseline.get('sizes', {}).get(size, {})
+        for stage, r in stages.items():
+            base = base_stages.get(stage)
+            if base is None:
+                continue
+            slower = r['seconds'] - base['seconds']
+            if slower > NOISE_FLOOR_SECONDS and r['seconds'] > base['seconds'] * (1 + tolerance):
+                regressions.append((size, stage, base['seconds'], r['seconds'], r['seconds'] / base['seconds']))
+    return regressions
+
+
+def print_table(report, baseline=None):
+    header = f"{'rows':>10}  {'stage':<22} {'seconds':>9} {'items/s':>12} {'peak MiB':>9} {'vs base':>8}"
+    print(header)
+    print('-' * len(header))
+    for size, stages in report['sizes'].items():
+        base_stages = (baseline or {}).get('sizes', {}).get(size, {})
+        for stage, r in stages.items():
+            rate = f"{r['rows_per_s']:,.0f}" if r['rows_per_s'] else '-'
+            peak = f"{r['peak_mib']:.1f}" if r['peak_mib'] is not None else '-'
+            base = base_stages.get(stage)
+            vs = f"{r['seconds'] / base['seconds']:.2f}x" if base and base['seconds'] > 0 else ''
+            print(f"{int(size):>10,}  {stage:<22} {r['seconds']:>9.4f} {rate:>12} {peak:>9} {vs:>8}")
+
+
+def run_bench(sizes, work_dir=WORK_DIR, baseline_path=BASELINE_FILE, save=False, repeat=REPEAT,
+              memory=True, tolerance=TOLERANCE):
+    """Benchmark every size, print the table, and compare with or save the baseline."""
+    report = {'environment': environment(), 'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'sizes': {}}
+    for rows in sizes:
+        report['sizes'][str(rows)] = bench_size(rows, work_dir, repeat=repeat, memory=memory)
+    # the menu loads its catalog in the background, so the largest one is the honest test
+    startup_dir = os.path.join(work_dir, f"startup_{max(sizes)}")
+    os.makedirs(startup_dir, exist_ok=True)
+    startup_csv = os.path.join(startup_dir, app.MOVIES_CSV)
+    if not os.path.exists(startup_csv):
+        shutil.copyfile(catalog_path(max(sizes), work_dir), startup_csv)
+    report['first_prompt_ms'] = time_to_first_prompt(startup_dir, runs=repeat)
+    baseline = None if save else load_baseline(baseline_path)
+    print()
+    print_table(report, baseline)
+    print(f"\nTime to first menu prompt: {report['first_prompt_ms']:.0f} ms (budget {STARTUP_BUDGET_MS} ms)")
+    if report['first_prompt_ms'] > STARTUP_BUDGET_MS:
+        print(f"Warning: startup is over the {STARTUP_BUDGET_MS} ms budget.")
+    if save:
+        save_baseline(baseline_path, report)
+        print(f"\nSaved baseline to {baseline_path}.")
+        return report
+    if baseline is None:
+        print(f"\nNo baseline at {baseline_path}; run with --save-baseline to create one.")
+        return report
+    if baseline.get('environment') != report['environment']:
+        print("\nWarning: baseline was recorded in a different environment; comparisons are approximate.")
+    regressions = compare(report, baseline, tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {tolerance:.0%}:")
+        for size, stage, before, after, ratio in regressions:
+            print(f"- {int(size):,} rows, {stage}: {before:.4f}s -> {after:.4f}s ({ratio:.2f}x)")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {tolerance:.0%} against {baseline_path}.")
+    return report
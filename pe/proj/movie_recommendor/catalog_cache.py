@@ -0,0 +1,165 @@
+"""
+catalog_cache.py
+On-disk columnar cache for the cleaned IMDb catalog.
+
+Each column is stored as its own .npy file so numeric columns can be
+memory-mapped on load. String columns are stored as one utf-8 text blob plus
+an int64 offsets array, categorical columns as integer codes plus their
+categories. A meta.json written last marks the cache as complete and records
+the fingerprint of the CSV it was built from.
+
+Derived data (feature matrices, fitted transformers) is stored the same way
+with save_arrays(), under its own name and key.
+"""
+
+import os
+import json
+import pickle
+import hashlib
+
+import numpy as np
+
+from lazy import LazyModule
+
+pd = LazyModule('pandas')
+
+CACHE_DIR = ".recommender_cache"   # created next to the CSV, one subdirectory per CSV
+CACHE_VERSION = 3                  # bump when the on-disk layout or cleaning rules change
+HASH_SAMPLE_BYTES = 1 << 20        # hash first/last 1 MiB instead of the whole file
+
+
+def cache_dir_for(csv_path):
+    # each CSV gets its own slot, so catalogs sharing a directory do not evict each other
+    csv_path = os.path.abspath(csv_path)
+    return os.path.join(os.path.dirname(csv_path), CACHE_DIR, os.path.basename(csv_path))
+
+
+def csv_fingerprint(csv_path, extra=None):
+    """Cheap fingerprint of a CSV: size, mtime and a hash of its head and tail."""
+    st = os.stat(csv_path)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{CACHE_VERSION}:{st.st_size}:{st.st_mtime_ns}".encode())
+    with open(csv_path, 'rb') as f:
+        h.update(f.read(HASH_SAMPLE_BYTES))
+        if st.st_size > 2 * HASH_SAMPLE_BYTES:
+            f.seek(-HASH_SAMPLE_BYTES, os.SEEK_END)
+            h.update(f.read(HASH_SAMPLE_BYTES))
+    if extra is not None:
+        h.update(json.dumps(extra, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def _write_strings(values, path_prefix):
+    values = [str(v) for v in values]
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum([len(v) for v in values], out=offsets[1:])
+    with open(path_prefix + ".txt", 'w', encoding='utf-8', newline='') as f:
+        f.write(''.join(values))
+    np.save(path_prefix + ".offsets.npy", offsets)
+
+
+def _read_strings(path_prefix):
+    with open(path_prefix + ".txt", 'r', encoding='utf-8', newline='') as f:
+        blob = f.read()
+    offsets = np.load(path_prefix + ".offsets.npy").tolist()
+    return [blob[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+
+
+def _read_meta(cache_dir, name):
+    meta_path = os.path.join(cache_dir, f"{name}.meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _write_meta(cache_dir, name, meta):
+    # write-then-rename so a half-written cache is never seen as valid
+    meta_path = os.path.join(cache_dir, f"{name}.meta.json")
+    tmp = meta_path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, meta_path)
+
+
+def save_frame(df, cache_dir, key, name="catalog"):
+    """Persist a DataFrame column by column under cache_dir, tagged with key."""
+    os.makedirs(cache_dir, exist_ok=True)
+    meta_path = os.path.join(cache_dir, f"{name}.meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)  # invalidate before overwriting columns
+    columns = []
+    for i, col in enumerate(df.columns):
+        prefix = os.path.join(cache_dir, f"{name}.{i}")
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            np.save(prefix + ".codes.npy", s.cat.codes.to_numpy())
+            _write_strings(s.cat.categories, prefix + ".cats")
+            kind = 'category'
+        elif pd.api.types.is_numeric_dtype(s.dtype) or pd.api.types.is_bool_dtype(s.dtype):
+            np.save(prefix + ".npy", s.to_numpy())
+            kind = 'numeric'
+        else:
+            _write_strings(s.fillna('').to_numpy(), prefix)
+            kind = 'string'
+        columns.append({'name': col, 'kind': kind})
+    _write_meta(cache_dir, name, {'key': key, 'rows': len(df), 'columns': columns})
+
+
+def load_frame(cache_dir, key, name="catalog", mmap=True):
+    """Load a cached DataFrame if its key matches, else return None."""
+    meta = _read_meta(cache_dir, name)
+    if meta is None or meta.get('key') != key:
+        return None
+    data = {}
+    try:
+        for i, spec in enumerate(meta['columns']):
+            prefix = os.path.join(cache_dir, f"{name}.{i}")
+            if spec['kind'] == 'category':
+                codes = np.load(prefix + ".codes.npy")
+                cats = _read_strings(prefix + ".cats")
+                data[spec['name']] = pd.Categorical.from_codes(codes, categories=cats)
+            elif spec['kind'] == 'numeric':
+                data[spec['name']] = np.load(prefix + ".npy", mmap_mode='r' if mmap else None)
+            else:
+                data[spec['name']] = _read_strings(prefix)
+    except (OSError, ValueError):
+        return None
+    return pd.DataFrame(data, copy=False)
+
+
+def save_arrays(arrays, cache_dir, key, name, objects=None):
+    """Persist named numpy arrays (plus optional picklable objects) under cache_dir."""
+    os.makedirs(cache_dir, exist_ok=True)
+    meta_path = os.path.join(cache_dir, f"{name}.meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    for arr_name, arr in arrays.items():
+        np.save(os.path.join(cache_dir, f"{name}.{arr_name}.npy"), np.asarray(arr))
+    if objects is not None:
+        with open(os.path.join(cache_dir, f"{name}.pkl"), 'wb') as f:
+            pickle.dump(objects, f, protocol=pickle.HIGHEST_PROTOCOL)
+    _write_meta(cache_dir, name, {'key': key, 'arrays': list(arrays), 'objects': objects is not None})
+
+
+def load_arrays(cache_dir, key, name, mmap=True):
+    """Return (arrays, objects) saved by save_arrays() if the key matches, else None."""
+    meta = _read_meta(cache_dir, name)
+    if meta is None or meta.get('key') != key:
+        return None
+    try:
+        arrays = {
+            arr_name: np.load(os.path.join(cache_dir, f"{name}.{arr_name}.npy"),
+                              mmap_mode='r' if mmap else None)
+            for arr_name in meta['arrays']
+        }
+        objects = None
+        if meta.get('objects'):
+            with open(os.path.join(cache_dir, f"{name}.pkl"), 'rb') as f:
+                objects = pickle.load(f)
+    except (OSError, ValueError, pickle.UnpicklingError, EOFError):
+        return None
+    return arrays, objects
@@ -0,0 +1,187 @@
+"""
+cf.py
+Collaborative filtering over every user's likes and dislikes.
+
+ALSModel factorizes the user x title ratings matrix with implicit-feedback
+alternating least squares: a like is a confident 1, a dislike a confident
+0, and every unrated title a weak 0. Each half step solves all users (or
+all titles) at once: the shared Y^T Y term is computed once, the per-row
+corrections come from batched matmuls over rows padded to a common
+length, and the small f x f systems go to one batched np.linalg.solve.
+Training runs once over all users; serving is a dot product with the
+title factors plus top_k. Users who were not in the training set, or whose ratings changed,
+are folded in by solving their one row against the fixed title factors.
+"""
+
+import json
+import hashlib
+
+import numpy as np
+
+from lazy import LazyModule
+
+import catalog_cache
+from scoring import top_k
+
+sp = LazyModule('scipy.sparse')
+
+CF_VERSION = 2
+FACTORS = 32
+REGULARIZATION = 0.1
+ALPHA = 20.0          # extra confidence of an explicit like/dislike over an unrated title
+ITERATIONS = 10
+BATCH_RATINGS = 65536  # padded ratings per batched solve; bounds the (rows, length, f) gather
+
+
+def ratings_key(triples):
+    # order-independent hash of (user_id, title, value) triples
+    h = hashlib.blake2b(digest_size=16)
+    for rec in sorted((str(u), t, int(v)) for u, t, v in triples):
+        h.update(json.dumps(rec, ensure_ascii=False).encode('utf-8'))
+    return h.hexdigest()
+
+
+def _solve_rows(W, CP, Y, reg):
+    """
+    Least-squares factors for every row of W against fixed factors Y.
+    W holds the extra confidence (c - 1) of each observed entry and CP the
+    target c * p, both as CSR matrices with rows = entities to solve.
+    """
+    n, f = W.shape[0], Y.shape[1]
+    YtY = Y.T @ Y + reg * np.eye(f)
+    B = np.asarray(CP @ Y)
+    X = np.zeros((n, f))
+    indptr, indices, weights = W.indptr, W.indices, W.data
+    counts = np.diff(indptr)
+    # rows of similar length are batched together and padded to the longest,
+    # so each batch is one (rows, length, f) gather and one batched matmul;
+    # rows without ratings keep x = 0 (their B row is 0)
+    order = np.argsort(counts, kind='stable')
+    sorted_counts = counts[order]
+    start = int(np.searchsorted(sorted_counts, 1))
+    while start < n:
+        ends = np.arange(start + 1, min(n, start + BATCH_RATINGS) + 1)
+        padded = (ends - start) * sorted_counts[ends - 1]
+        end = start + max(1, int(np.searchsorted(padded, BATCH_RATINGS, side='right')))
+        rows = order[start:end]
+        length = int(sorted_counts[end - 1])
+        pos = indptr[rows][:, None] + np.arange(length)
+        valid = np.arange(length) < counts[rows][:, None]
+        pos = np.where(valid, pos, 0)
+        Yw = Y[indices[pos]] * (np.sqrt(weights[pos]) * valid)[:, :, None]
+        A = YtY + Yw.transpose(0, 2, 1) @ Yw
+        X[rows] = np.linalg.solve(A, B[rows][:, :, None])[:, :, 0]
+        start = end
+    return X
+
+
+def _matrices(rows, cols, values, shape, alpha):
+    # (extra confidence, confidence * preference) CSR matrices for the observed entries
+    W = sp.csr_matrix((np.full(len(rows), alpha), (rows, cols)), shape=shape)
+    CP = sp.csr_matrix(((1 + alpha) * np.asarray(values, dtype=np.float64), (rows, cols)), shape=shape)
+    return W, CP
+
+
+class ALSModel:
+    """Per-user and per-title factor matrices from alternating least squares."""
+
+    def __init__(self, user_ids, item_titles, user_factors, item_factors, rated_indptr, rated_items,
+                 reg=REGULARIZATION, alpha=ALPHA):
+        self.user_ids = list(user_ids)
+        self.item_titles = np.asarray(item_titles, dtype=object)
+        self.user_factors = user_factors  # (users, f)
+        self.item_factors = item_factors  # (titles, f)
+        self.rated_indptr = rated_indptr  # rated_items[rated_indptr[u]:rated_indptr[u+1]] were rated by user u
+        self.rated_items = rated_items
+        self.reg = reg
+        self.alpha = alpha
+        self.user_row = {u: i for i, u in enumerate(self.user_ids)}
+        self.item_row = {t: i for i, t in enumerate(self.item_titles)}
+
+    @classmethod
+    def fit(cls, triples, titles=None, factors=FACTORS, reg=REGULARIZATION, alpha=ALPHA,
+            iterations=ITERATIONS, seed=0):
+        """
+        Train on (user_id, title, value) triples; later triples win for a
+        repeated (user, title). Titles outside `titles` are ignored when given.
+        """
+        latest = {}
+        for user, title, value in triples:
+            if titles is None or title in titles:
+                latest[(str(user), title)] = int(value)
+        user_ids = sorted({u for u, _ in latest})
+        item_titles = sorted({t for _, t in latest})
+        user_row = {u: i for i, u in enumerate(user_ids)}
+        item_row = {t: i for i, t in enumerate(item_titles)}
+        rows = np.fromiter((user_row[u] for u, _ in latest), dtype=np.int64, count=len(latest))
+        cols = np.fromiter((item_row[t] for _, t in latest), dtype=np.int64, count=len(latest))
+        values = np.fromiter(latest.values(), dtype=np.float64, count=len(latest))
+
+        shape = (len(user_ids), len(item_titles))
+        W_users, CP_users = _matrices(rows, cols, values, shape, alpha)
+        W_items, CP_items = W_users.T.tocsr(), CP_users.T.tocsr()
+        rng = np.random.default_rng(seed)
+        V = rng.normal(scale=0.01, size=(len(item_titles), factors))
+        U = np.zeros((len(user_ids), factors))
+        for _ in range(iterations):
+            U = _solve_rows(W_users, CP_users, V, reg)
+            V = _solve_rows(W_items, CP_items, U, reg)
+        return cls(user_ids, item_titles, U.astype(np.float32), V.astype(np.float32),
+                   W_users.indptr.astype(np.int64), W_users.indices.astype(np.int32), reg=reg, alpha=alpha)
+
+    @classmethod
+    def open(cls, triples, titles=None, cache_dir=None, catalog_key=None):
+        """Load the model trained on exactly these ratings, or train and save it."""
+        triples = list(triples)
+        key = None
+        if catalog_key:
+            key = f"{catalog_key}:{CF_VERSION}:{FACTORS}:{REGULARIZATION}:{ALPHA}:{ratings_key(triples)}"
+            found = catalog_cache.load_arrays(cache_dir, key, name='als')
+            if found is not None:
+                arrays, objects = found
+                return cls(objects['user_ids'], objects['item_titles'], arrays['user_factors'],
+                           arrays['item_factors'], arrays['rated_indptr'], arrays['rated_items'],
+                           reg=REGULARIZATION, alpha=ALPHA)
+        model = cls.fit(triples, titles=titles)
+        if key:
+            try:
+                model.save(cache_dir, key)
+            except OSError as e:
+                print(f"Warning: could not write ALS model ({e}).")
+        return model
+
+    def save(self, cache_dir, key):
+        arrays = {'user_factors': self.user_factors, 'item_factors': self.item_factors,
+                  'rated_indptr': self.rated_indptr, 'rated_items': self.rated_items}
+        objects = {'user_ids': self.user_ids, 'item_titles': list(self.item_titles)}
+        catalog_cache.save_arrays(arrays, cache_dir, key, name='als', objects=objects)
+
+    def fold_in(self, ratings):
+        """Factor vector for a title -> 0/1 dict, keeping the title factors fixed."""
+        known = [(self.item_row[t], int(v)) for t, v in ratings.items() if t in self.item_row]
+        cols = np.array([c for c, _ in known], dtype=np.int64)
+        values = np.array([v for _, v in known], dtype=np.float64)
+        W, CP = _matrices(np.zeros(len(known), dtype=np.int64), cols, values,
+                          (1, len(self.item_titles)), self.alpha)
+        return _solve_rows(W, CP, self.item_factors.astype(np.float64), self.reg)[0].astype(np.float32)
+
+    def user_vector(self, user_id):
+        row = self.user_row.get(str(user_id))
+        return None if row is None else self.user_factors[row]
+
+    def rated_titles(self, user_id):
+        """Titles user_id rated in the training data (none for an unknown user)."""
+        row = self.user_row.get(str(user_id))
+        if row is None:
+            return self.item_titles[:0]
+        return self.item_titles[self.rated_items[self.rated_indptr[row]:self.rated_indptr[row + 1]]]
+
+    def recommend(self, u, k=10, exclude=()):
+        """The k titles with the highest predicted preference for factor vector u, as (titles, scores)."""
+        scores = self.item_factors @ u
+        skip = [self.item_row[t] for t in exclude if t in self.item_row]
+        candidates = np.ones(len(scores), dtype=bool)
+        candidates[skip] = False
+        ids = np.flatnonzero(candidates)
+        picked = top_k(scores[ids], k, ids=ids)
+        return self.item_titles[picked], scores[picked]
@@ -0,0 +1,289 @@
+"""
+fuzzy.py
+Typo-tolerant title matching with a bounded edit distance.
+
+Candidates come from the trigram index (title_index.TitleIndex): a title
+within edit distance d of the query shares all but at most 3*d of the
+query's trigrams, so only rows that hit enough posting lists are verified
+(the q-gram count filter). Survivors are checked a block of titles at a
+time by block_distances(), which runs the Levenshtein dynamic programme
+over all of them at once with numpy. In partial mode the query may match
+anywhere inside the title, which suits the CLI's "(partial) movie title"
+prompt.
+
+Short queries (3*d trigrams or fewer) get no guarantee from the count
+filter, since a match may share no trigram at all ("hoem" vs "home").
+Those go to a DeletionIndex instead: every word of a title, and every run
+of consecutive words, of at most 4*d + 2 characters is stored under the
+hashes of all its variants with up to d characters deleted. Two strings
+within d edits share such a variant, so a short query only looks up its
+own deletion variants and verifies the few terms they point to. A short
+query therefore matches whole words (or runs of words) of a title, and
+its distance is the distance to that term.
+"""
+
+import re
+import itertools
+
+import numpy as np
+
+import catalog_cache
+from title_index import normalize, query_grams
+
+FUZZY_INDEX_VERSION = 1
+MAX_DISTANCE = 2
+SCAN_BLOCK_ROWS = 50_000  # titles per block_distances() call
+_HASH_MULT = np.uint64(0x100000001B3)
+_WORD = re.compile(r'\S+')
+
+
+def bounded_distance(query, text, max_distance, partial=False):
+    """
+    Edit distance between query and text, or max_distance + 1 if it is larger.
+    With partial=True, the distance to the closest substring of text.
+    """
+    n = len(text)
+    if not partial and abs(len(query) - n) > max_distance:
+        return max_distance + 1
+    prev = [0] * (n + 1) if partial else list(range(n + 1))
+    for i, qc in enumerate(query, 1):
+        cur = [i] + [0] * n
+        best = i
+        for j, tc in enumerate(text, 1):
+            cost = prev[j - 1] + (qc != tc)
+            if prev[j] + 1 < cost:
+                cost = prev[j] + 1
+            if cur[j - 1] + 1 < cost:
+                cost = cur[j - 1] + 1
+            cur[j] = cost
+            if cost < best:
+                best = cost
+        if best > max_distance:
+            return max_distance + 1
+        prev = cur
+    dist = min(prev) if partial else prev[n]
+    return dist if dist <= max_distance else max_distance + 1
+
+
+def block_distances(query, texts, max_distance, partial=False):
+    """
+    bounded_distance() of query to each of texts, vectorized: the texts are laid
+    end to end, each after a separator that acts as its column 0, and each DP row
+    is one numpy pass over all of them.
+    """
+    q = np.frombuffer(query.encode('utf-32-le'), dtype=np.uint32)
+    flat = np.frombuffer(('\x00' + '\x00'.join(texts)).encode('utf-32-le'), dtype=np.uint32)
+    lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+    starts = np.concatenate([[0], np.cumsum(lengths + 1)[:-1]])  # separator of each text
+    seg = np.repeat(np.arange(len(texts), dtype=np.int64), lengths + 1)
+    pos = np.arange(len(flat), dtype=np.int64)
+    col = pos - starts[seg]
+    is_sep = col == 0
+    # insertions run along a row as a running minimum of (cost - position); the
+    # per-text offset keeps that minimum from leaking across texts
+    shift = pos + seg * (len(q) + 2)
+    prev = np.zeros(len(flat), dtype=np.int64) if partial else col
+    for i, qc in enumerate(q, 1):
+        cur = np.empty_like(prev)
+        cur[0] = i
+        cur[1:] = np.minimum(prev[:-1] + (flat[1:] != qc), prev[1:] + 1)
+        cur[is_sep] = i
+        prev = np.minimum.accumulate(cur - shift) + shift
+    dist = np.minimum.reduceat(prev, starts) if partial else prev[starts + lengths]
+    return np.where(dist <= max_distance, dist, max_distance + 1)
+
+
+def max_term_chars(max_distance):
+    # longest short query (3*d trigrams = 3*d + 2 characters) plus d insertions
+    return 4 * max_distance + 2
+
+
+def deletion_hashes(codes, max_deletes):
+    """
+    Hashes of every variant of each row of codes (an (n, L) code point
+    matrix) with up to max_deletes characters removed, as an (n, variants) array.
+    """
+    n, length = codes.shape
+    codes = codes.astype(np.uint64)
+    out = []
+    for deletes in range(min(max_deletes, length) + 1):
+        for dropped in itertools.combinations(range(length), deletes):
+            h = np.full(n, length - deletes, dtype=np.uint64)  # the variant's length seeds the hash
+            for j in range(length):
+                if j not in dropped:
+                    h = (h ^ codes[:, j]) * _HASH_MULT
+            out.append(h)
+    return np.stack(out, axis=1)
+
+
+def _codes(texts, length):
+    # (len(texts), length) code point matrix of equal-length strings
+    return np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32).reshape(len(texts), length)
+
+
+class DeletionIndex:
+    """Deletion-variant hash -> term -> catalog rows, for short fuzzy queries."""
+
+    def __init__(self, terms, hashes, hash_terms, offsets, rows, max_distance):
+        self.terms = terms            # words and word runs of at most max_term_chars(max_distance)
+        self.hashes = hashes          # sorted deletion-variant hashes
+        self.hash_terms = hash_terms  # term id of each hash
+        self.offsets = offsets        # rows[offsets[i]:offsets[i+1]] contain terms[i]
+        self.rows = rows
+        self.max_distance = max_distance
+
+    @classmethod
+    def build(cls, norm, max_distance=MAX_DISTANCE):
+        """Index the short words and word runs of normalized titles."""
+        limit = max_term_chars(max_distance)
+        term_id = {}
+        pair_terms, pair_rows = [], []
+        for row, title in enumerate(norm):
+            words = [(m.start(), m.end()) for m in _WORD.finditer(title)]
+            for i, (start, _) in enumerate(words):
+                for _, end in words[i:]:
+                    if end - start > limit:
+                        break
+                    pair_terms.append(term_id.setdefault(title[start:end], len(term_id)))
+                    pair_rows.append(row)
+        terms = list(term_id)
+        pair_terms = np.array(pair_terms, dtype=np.int32)
+        pair_rows = np.array(pair_rows, dtype=np.int32)
+        order = np.lexsort((pair_rows, pair_terms))
+        pair_terms, pair_rows = pair_terms[order], pair_rows[order]
+        # a row can hold the same term twice ("love me love")
+        keep = np.ones(len(pair_terms), dtype=bool)
+        keep[1:] = (pair_terms[1:] != pair_terms[:-1]) | (pair_rows[1:] != pair_rows[:-1])
+        pair_terms, pair_rows = pair_terms[keep], pair_rows[keep]
+        offsets = np.searchsorted(pair_terms, np.arange(len(terms) + 1)).astype(np.int64)
+
+        lengths = np.fromiter((len(t) for t in terms), dtype=np.int64, count=len(terms))
+        all_hashes, all_terms = [], []
+        for length in np.unique(lengths):
+            ids = np.flatnonzero(lengths == length)
+            h = deletion_hashes(_codes([terms[i] for i in ids], int(length)), max_distance)
+            all_hashes.append(h.ravel())
+            all_terms.append(np.repeat(ids.astype(np.int32), h.shape[1]))
+        hashes = np.concatenate(all_hashes) if all_hashes else np.empty(0, dtype=np.uint64)
+        hash_terms = np.concatenate(all_terms) if all_terms else np.empty(0, dtype=np.int32)
+        order = np.argsort(hashes, kind='stable')
+        return cls(terms, hashes[order], hash_terms[order], offsets, pair_rows, max_distance)
+
+    @classmethod
+    def open(cls, norm, max_distance=MAX_DISTANCE, cache_dir=None, key=None):
+        """Load the index saved for this catalog key, or build and save it."""
+        if key:
+            key = f"{key}:{FUZZY_INDEX_VERSION}:{max_distance}"
+            found = catalog_cache.load_arrays(cache_dir, key, name='fuzzy_index')
+            if found is not None:
+                arrays, objects = found
+                return cls(objects['terms'], arrays['hashes'], arrays['hash_terms'], arrays['offsets'],
+                           arrays['rows'], max_distance)
+        index = cls.build(norm, max_distance)
+        if key:
+            try:
+                index.save(cache_dir, key)
+            except OSError as e:
+                print(f"Warning: could not write fuzzy index ({e}).")
+        return index
+
+    def save(self, cache_dir, key):
+        arrays = {'hashes': self.hashes, 'hash_terms': self.hash_terms,
+                  'offsets': self.offsets, 'rows': self.rows}
+        catalog_cache.save_arrays(arrays, cache_dir, key, name='fuzzy_index', objects={'terms': self.terms})
+
+    def covers(self, query, max_distance):
+        # every term within max_distance of query is short enough to be indexed
+        return max_distance <= self.max_distance and len(query) + max_distance <= max_term_chars(self.max_distance)
+
+    def lookup(self, query, max_distance):
+        """(term ids, distances) of the indexed terms within max_distance of query."""
+        wanted = np.unique(deletion_hashes(_codes([query], len(query)), max_distance))
+        lo = np.searchsorted(self.hashes, wanted, side='left')
+        hi = np.searchsorted(self.hashes, wanted, side='right')
+        ids = np.unique(np.concatenate([self.hash_terms[a:b] for a, b in zip(lo, hi)] or [np.empty(0, np.int32)]))
+        dist = np.array([bounded_distance(query, self.terms[t], max_distance) for t in ids], dtype=np.int64)
+        hit = dist <= max_distance
+        return ids[hit], dist[hit]
+
+
+class FuzzyMatcher:
+    """k-closest title lookup on top of a TitleIndex."""
+
+    def __init__(self, index, max_distance=MAX_DISTANCE, deletions=None):
+        self.index = index
+        self.max_distance = max_distance
+        self.lengths = np.fromiter((len(t) for t in index.norm), dtype=np.int32, count=len(index.norm))
+        self.deletions = deletions if deletions is not None else DeletionIndex.build(index.norm, max_distance)
+
+    @classmethod
+    def open(cls, index, max_distance=MAX_DISTANCE, cache_dir=None, key=None):
+        """Matcher over index whose DeletionIndex is persisted with the catalog cache."""
+        return cls(index, max_distance, DeletionIndex.open(index.norm, max_distance, cache_dir, key))
+
+    def length_ok(self, rows, query, max_distance, partial):
+        # length filter: a whole-title match differs in length by at most d
+        lengths = self.lengths[rows]
+        if partial:
+            return lengths >= len(query) - max_distance
+        return np.abs(lengths - len(query)) <= max_distance
+
+    def candidates(self, query, max_distance, partial):
+        """Rows to verify for a query long enough for the count filter to hold."""
+        grams = query_grams(query)
+        postings = [self.index.posting(g) for g in grams]
+        rows, counts = np.unique(np.concatenate(postings), return_counts=True)
+        # count filter: each edit destroys at most 3 of the query's trigrams
+        keep = counts >= len(grams) - 3 * max_distance
+        keep &= self.length_ok(rows, query, max_distance, partial)
+        return rows[keep]
+
+    def verify(self, query, rows, max_distance, partial):
+        """Distances from query to the titles of rows, max_distance + 1 where farther."""
+        dist = np.empty(len(rows), dtype=np.int64)
+        for start in range(0, len(rows), SCAN_BLOCK_ROWS):
+            block = rows[start:start + SCAN_BLOCK_ROWS]
+            dist[start:start + len(block)] = block_distances(
+                query, [self.index.norm[r] for r in block], max_distance, partial)
+        return dist
+
+    def lookup(self, query, max_distance, partial):
+        """(rows, distances) for a short query, through the DeletionIndex."""
+        d = self.deletions
+        ids, term_dist = d.lookup(query, max_distance)
+        spans = [(d.offsets[t], d.offsets[t + 1]) for t in ids]
+        rows = np.concatenate([d.rows[a:b] for a, b in spans] or [np.empty(0, np.int32)]).astype(np.int64)
+        dist = np.repeat(term_dist, [b - a for a, b in spans])
+        if not partial:
+            # only a term as long as its title is the whole title
+            whole = np.repeat(np.array([len(d.terms[t]) for t in ids], dtype=np.int64), [b - a for a, b in spans])
+            keep = whole == self.lengths[rows]
+            rows, dist = rows[keep], dist[keep]
+        # a row holding several matching terms keeps the closest
+        order = np.lexsort((dist, rows))
+        rows, dist = rows[order], dist[order]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = rows[1:] != rows[:-1]
+        return rows[first], dist[first]
+
+    def match(self, query, k=10, max_distance=None, partial=True, weights=None):
+        """
+        Up to k (row, distance) pairs for the titles closest to query, nearest
+        first; ties go to the higher weight (e.g. numVotes), then catalog order.
+        """
+        d = self.max_distance if max_distance is None else max_distance
+        q = normalize(query)
+        if len(query_grams(q)) > 3 * d:
+            rows = self.candidates(q, d, partial)
+            dist = self.verify(q, rows, d, partial)
+        elif self.deletions.covers(q, d):
+            rows, dist = self.lookup(q, d, partial)
+        else:
+            # a wider distance than the index was built for: check every row the length filter allows
+            rows = np.flatnonzero(self.length_ok(np.arange(len(self.lengths)), q, d, partial))
+            dist = self.verify(q, rows, d, partial)
+        hit = dist <= d
+        rows, dist = rows[hit], dist[hit]
+        w = np.zeros(len(rows)) if weights is None else -np.asarray(weights, dtype=np.float64)[rows]
+        order = np.lexsort((rows, w, dist))[:k]
+        return list(zip(rows[order].tolist(), dist[order].tolist()))
@@ -0,0 +1,203 @@
+"""
+instrument.py
+Opt-in per-stage timing and memory records for the recommender pipeline.
+
+    python app.py --profile stages.jsonl            # menu, with a summary on exit
+    python app.py --profile - batch --ratings ...   # records on stdout
+
+Functions decorated with @stage(name) record one entry per call while
+instrumentation is enabled: wall time, CPU time (process_time), rows
+processed and, with memory tracing on, the tracemalloc peak above the
+allocation level at entry. Nested stages (FeatureStore.open calling
+build_features, say) are recorded separately with their depth. Records
+are appended to a JSON-lines stream as they happen, kept for summary(),
+and a summary table is printed at exit.
+
+Stages may run on several threads (the menu loads the catalog and
+re-trains in the background). tracemalloc's peak and process_time() are
+process-wide, so a stage that overlaps a stage on another thread is
+flagged 'concurrent': its peak_mib is null and its cpu_s includes the
+other thread's work. Wall times are unaffected.
+
+When disabled, a decorated call costs one global flag check.
+"""
+
+import sys
+import json
+import time
+import atexit
+import functools
+import threading
+import tracemalloc
+
+ENABLED = False
+TRACE_MEMORY = False
+
+_sink = None       # JSON-lines output (file or stdout) while enabled
+_records = []
+_stacks = {}       # thread id -> open stages, [start allocation, highest peak seen by children, concurrent, rows]
+_lock = threading.Lock()
+_owns_tracing = False
+
+
+def _count(value):
+    # rows in a stage result; None if it has no length
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+def enable(path=None, memory=True, summary_at_exit=True):
+    """Start recording; path is a JSONL file ('-' for stdout, None to keep records in memory only)."""
+    global ENABLED, TRACE_MEMORY, _sink, _owns_tracing
+    if path == '-':
+        _sink = sys.stdout
+    elif path:
+        _sink = open(path, 'a', encoding='utf-8')
+    TRACE_MEMORY = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _owns_tracing = True
+    ENABLED = True
+    if summary_at_exit:
+        atexit.register(_finish)
+
+
+def disable():
+    global ENABLED, TRACE_MEMORY, _sink, _owns_tracing
+    ENABLED = False
+    TRACE_MEMORY = False
+    if _owns_tracing:
+        tracemalloc.stop()
+        _owns_tracing = False
+    if _sink is not None and _sink is not sys.stdout:
+        _sink.close()
+    _sink = None
+
+
+def _finish():
+    if _records:
+        # keep a JSONL stream on stdout parseable
+        print_summary(file=sys.stderr if _sink is sys.stdout else sys.stdout)
+    disable()
+
+
+def records():
+    return list(_records)
+
+
+def _open_stages():
+    # stages on background threads (catalog loading, re-training) nest separately
+    return _stacks.setdefault(threading.get_ident(), [])
+
+
+def stage(name, rows=None):
+    """
+    Decorator recording each call as stage `name` while enabled.
+    rows(result, args, kwargs) gives the rows processed; by default the
+    length of the result, or of its first item for tuple results. A stage
+    that knows better (recommend() scoring a shortlist) calls set_rows().
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            return _run(name, rows, fn, args, kwargs)
+        return wrapper
+    return decorate
+
+
+def _run(name, rows, fn, args, kwargs):
+    tracing = TRACE_MEMORY and tracemalloc.is_tracing()
+    with _lock:
+        _stack = _open_stages()
+        # another thread's open stage shares the peak counter and CPU clock with this one
+        concurrent = any(open_ for ident, open_ in _stacks.items() if ident != threading.get_ident())
+        if concurrent:
+            for open_ in _stacks.values():
+                for frame in open_:
+                    frame[2] = True
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if _stack:
+                # keep the parent's peak so far before this stage resets it
+                _stack[-1][1] = max(_stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            _stack.append([current, current, concurrent, None])
+        else:
+            _stack.append([0, 0, concurrent, None])
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+        with _lock:
+            start, child_peak, concurrent, n = _stack.pop()
+            peak_mib = None
+            if tracing:
+                peak = max(tracemalloc.get_traced_memory()[1], child_peak)
+                if not concurrent:
+                    peak_mib = (peak - start) / 2**20
+                if _stack:
+                    _stack[-1][1] = max(_stack[-1][1], peak)
+    if n is not None:
+        pass  # reported by the stage itself through set_rows()
+    elif rows is not None:
+        n = rows(result, args, kwargs)
+    else:
+        n = _count(result[0] if isinstance(result, tuple) and result else result)
+    _emit({'stage': name, 'wall_s': wall, 'cpu_s': cpu, 'rows': n, 'peak_mib': peak_mib,
+           'depth': len(_stack), 'concurrent': concurrent, 'time': time.time()})
+    return result
+
+
+def set_rows(n):
+    """Report the rows the innermost open stage on this thread actually processed."""
+    if ENABLED:
+        stack = _open_stages()
+        if stack:
+            stack[-1][3] = int(n)
+
+
+def record(name, wall_s, cpu_s=None, rows=None):
+    """Record a stage timed by the caller (e.g. time to first prompt) while enabled."""
+    if ENABLED:
+        _stack = _open_stages()
+        _emit({'stage': name, 'wall_s': wall_s, 'cpu_s': cpu_s, 'rows': rows, 'peak_mib': None,
+               'depth': len(_stack), 'concurrent': False, 'time': time.time()})
+
+
+def _emit(record):
+    _records.append(record)
+    if _sink is not None:
+        _sink.write(json.dumps(record) + "\n")
+        _sink.flush()
+
+
+def summary(recs=None):
+    """Per-stage totals: {stage: {'calls', 'wall_s', 'cpu_s', 'rows', 'peak_mib'}}, in first-seen order."""
+    out = {}
+    for r in _records if recs is None else recs:
+        s = out.setdefault(r['stage'], {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'rows': 0, 'peak_mib': None})
+        s['calls'] += 1
+        s['wall_s'] += r['wall_s']
+        s['cpu_s'] += r['cpu_s'] or 0.0
+        s['rows'] += r['rows'] or 0
+        if r['peak_mib'] is not None:
+            s['peak_mib'] = max(s['peak_mib'] or 0.0, r['peak_mib'])
+    return out
+
+
+def print_summary(recs=None, file=None):
+    header = f"{'stage':<16} {'calls':>5} {'wall s':>9} {'mean s':>9} {'cpu s':>9} {'rows':>12} {'rows/s':>12} {'peak MiB':>9}"
+    file = file or sys.stdout
+    print("\n" + header, file=file)
+    print('-' * len(header), file=file)
+    for name, s in summary(recs).items():
+        rate = f"{s['rows'] / s['wall_s']:,.0f}" if s['rows'] and s['wall_s'] > 0 else '-'
+        peak = f"{s['peak_mib']:.1f}" if s['peak_mib'] is not None else '-'
+        print(f"{name:<16} {s['calls']:>5} {s['wall_s']:>9.3f} {s['wall_s'] / s['calls']:>9.3f} "
+              f"{s['cpu_s']:>9.3f} {s['rows']:>12,} {rate:>12} {peak:>9}", file=file)
@@ -0,0 +1,35 @@
+"""
+lazy.py
+Deferred imports for the heavy libraries (pandas, scipy, scikit-learn).
+
+    pd = LazyModule('pandas')
+
+binds a stand-in that imports the real module the first time one of its
+attributes is used, so importing app.py and showing the menu does not pay
+for libraries that only catalog loading and training need. The import
+itself goes through importlib and is safe to trigger from several threads.
+"""
+
+import importlib
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access."""
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            module = importlib.import_module(self.__dict__['_name'])
+            self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded'
+        return f"<lazy module {self.__dict__['_name']!r} ({state})>"
@@ -0,0 +1,238 @@
+"""
+ratings_store.py
+Crash-safe storage for user ratings.
+
+RatingsJournal keeps the familiar user_ratings.json as a snapshot and
+appends every change to a JSON-lines journal next to it, so a single
+rating costs one short append instead of rewriting the whole file. Appends
+are fsync'ed in batches, and the journal is folded back into the snapshot
+(written to a temp file, fsync'ed and renamed into place) once it grows
+past COMPACT_EVERY records. On load the snapshot is read and the journal
+replayed; a torn last line from a crash is cut off.
+
+SqliteRatingsStore serves many users from one SQLite database in WAL mode.
+Titles get integer ids, ratings are keyed by (user_id, title_id) so one
+user's ratings come back from a single primary-key range scan, and writes
+can be batched with upsert_many().
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+
+FSYNC_EVERY = 8        # journal appends between fsyncs
+COMPACT_EVERY = 1000   # journal records before folding into the snapshot
+
+
+def _fsync_dir(path):
+    # make a rename durable; not supported on every platform
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)) or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_snapshot(path, ratings):
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(ratings, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(path)
+
+
+class RatingsJournal:
+    """title -> 0/1 ratings as a JSON snapshot plus an append-only JSON-lines journal."""
+
+    def __init__(self, snapshot_path, journal_path=None, fsync_every=FSYNC_EVERY,
+                 compact_every=COMPACT_EVERY):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + ".jsonl"
+        self.fsync_every = fsync_every
+        self.compact_every = compact_every
+        self.ratings = {}
+        self.records = 0      # journal records not yet folded into the snapshot
+        self.unsynced = 0
+        self.handle = None
+
+    def load(self):
+        """Snapshot plus replayed journal, as a fresh dict."""
+        ratings = {}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                ratings = json.load(f)
+        self.records = 0
+        if os.path.exists(self.journal_path):
+            good_end = 0
+            with open(self.journal_path, 'rb') as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line.decode('utf-8'))
+                    except (UnicodeDecodeError, json.JSONDecodeError):
+                        break  # torn write at the tail from a crash
+                    if not line.endswith(b"\n"):
+                        break
+                    self._apply(ratings, rec)
+                    self.records += 1
+                    good_end += len(line)
+            if good_end < os.path.getsize(self.journal_path):
+                # drop the torn tail so later appends start on a clean line
+                with open(self.journal_path, 'r+b') as f:
+                    f.truncate(good_end)
+        self.ratings = dict(ratings)
+        return ratings
+
+    @staticmethod
+    def _apply(ratings, rec):
+        op = rec.get('op')
+        if op == 'set':
+            ratings[rec['title']] = rec['value']
+        elif op == 'del':
+            ratings.pop(rec['title'], None)
+        elif op == 'clear':
+            ratings.clear()
+
+    def _append(self, rec):
+        if self.handle is None:
+            self.handle = open(self.journal_path, 'a', encoding='utf-8')
+        self.handle.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self.handle.flush()
+        self._apply(self.ratings, rec)
+        self.records += 1
+        self.unsynced += 1
+        if self.unsynced >= self.fsync_every:
+            self.sync()
+        if self.records >= self.compact_every:
+            self.compact()
+
+    def record(self, title, value):
+        """Append one rating; O(1) regardless of how many ratings exist."""
+        self._append({'op': 'set', 'title': title, 'value': int(value)})
+
+    def remove(self, title):
+        self._append({'op': 'del', 'title': title})
+
+    def clear(self):
+        self._append({'op': 'clear'})
+
+    def sync(self):
+        if self.handle is not None and self.unsynced:
+            os.fsync(self.handle.fileno())
+        self.unsynced = 0
+
+    def compact(self, ratings=None):
+        """Write the current ratings as the snapshot and start an empty journal."""
+        if ratings is not None:
+            self.ratings = dict(ratings)
+        self.sync()
+        write_snapshot(self.snapshot_path, self.ratings)
+        # the snapshot already holds every journal record, so truncating is safe
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+        with open(self.journal_path, 'w', encoding='utf-8'):
+            pass
+        self.records = 0
+
+    def close(self):
+        self.sync()
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS titles (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS ratings (
+    user_id TEXT NOT NULL,
+    title_id INTEGER NOT NULL REFERENCES titles(id),
+    value INTEGER NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (user_id, title_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ratings_by_title ON ratings (title_id);
+"""
+
+
+class SqliteRatingsStore:
+    """Per-user title -> 0/1 ratings in SQLite (WAL mode), safe to share across threads."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def _title_ids(self, titles):
+        # insert unseen titles, then map every title to its id
+        titles = list(dict.fromkeys(titles))
+        self.conn.executemany("INSERT OR IGNORE INTO titles (title) VALUES (?)", ((t,) for t in titles))
+        ids = {}
+        for start in range(0, len(titles), 500):
+            chunk = titles[start:start + 500]
+            marks = ','.join('?' * len(chunk))
+            ids.update(self.conn.execute(f"SELECT title, id FROM titles WHERE title IN ({marks})", chunk))
+        return ids
+
+    def load(self, user_id):
+        """One user's ratings as a title -> 0/1 dict."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT t.title, r.value FROM ratings r JOIN titles t ON t.id = r.title_id "
+                "WHERE r.user_id = ?", (user_id,))
+            return {title: value for title, value in rows}
+
+    def upsert_many(self, records):
+        """Insert or update many (user_id, title, value) records in one transaction."""
+        with self.lock, self.conn:
+            self._upsert(records)
+
+    def _upsert(self, records):
+        # caller holds the lock and the transaction
+        records = list(records)
+        if not records:
+            return
+        now = time.time()
+        ids = self._title_ids(title for _, title, _ in records)
+        self.conn.executemany(
+            "INSERT INTO ratings (user_id, title_id, value, updated) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (user_id, title_id) DO UPDATE SET value = excluded.value, updated = excluded.updated",
+            ((user, ids[title], int(value), now) for user, title, value in records))
+
+    def record(self, user_id, title, value):
+        self.upsert_many([(user_id, title, value)])
+
+    def replace(self, user_id, ratings):
+        """Make ratings the complete set for user_id, in one transaction."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM ratings WHERE user_id = ?", (user_id,))
+            self._upsert((user_id, title, value) for title, value in ratings.items())
+
+    def users(self):
+        with self.lock:
+            return [u for (u,) in self.conn.execute("SELECT DISTINCT user_id FROM ratings ORDER BY user_id")]
+
+    def all_ratings(self):
+        """Every (user_id, title, value) row, grouped by user."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT r.user_id, t.title, r.value FROM ratings r JOIN titles t ON t.id = r.title_id "
+                "ORDER BY r.user_id").fetchall()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,85 @@
+"""
+rec_cache.py
+Memoized recommend() results.
+
+Entries are keyed by (ratings source, ratings hash, classifier, top_n,
+catalog version), kept in least-recently-used order with a size bound, and
+persisted as a small JSON file in the catalog cache directory. When a
+ratings source is saved with new contents, only that source's entries for
+other ratings hashes are dropped.
+"""
+
+import os
+import json
+from collections import OrderedDict
+
+REC_CACHE_FILE = "recommendations.json"
+REC_CACHE_SIZE = 256  # entries kept before the least recently used is evicted
+
+
+class RecommendationCache:
+    """Bounded LRU cache of recommendation lists, persisted as JSON."""
+
+    def __init__(self, path=None, max_entries=REC_CACHE_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    @staticmethod
+    def key(source, ratings_hash, classifier, top_n, catalog):
+        return '|'.join([str(source), ratings_hash, classifier, str(top_n), str(catalog)])
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return  # a damaged cache is just a cold cache
+        for entry in data.get('entries', []):
+            self.entries[entry['key']] = entry
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'entries': list(self.entries.values())}, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"Warning: could not write recommendation cache ({e}).")
+
+    def get(self, source, ratings_hash, classifier, top_n, catalog):
+        """Cached recommendation list, or None."""
+        key = self.key(source, ratings_hash, classifier, top_n, catalog)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry['recs']
+
+    def put(self, source, ratings_hash, classifier, top_n, catalog, recs):
+        key = self.key(source, ratings_hash, classifier, top_n, catalog)
+        self.entries[key] = {'key': key, 'source': str(source), 'ratings': ratings_hash, 'recs': recs}
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self.save()
+
+    def invalidate(self, source, keep_ratings_hash=None):
+        """Drop the entries computed from `source`, except those for keep_ratings_hash."""
+        stale = [k for k, e in self.entries.items()
+                 if e['source'] == str(source) and e['ratings'] != keep_ratings_hash]
+        for k in stale:
+            del self.entries[k]
+        if stale:
+            self.save()
+        return len(stale)
@@ -0,0 +1,88 @@
+"""
+retrieval.py
+Cheap first-stage candidate generation for recommend().
+
+Scoring every unwatched title with a random forest is the expensive part
+of a recommendation, yet almost all of those titles are nowhere near a top
+10. prescore() ranks the whole catalog with a single sparse mat-vec over
+the model inputs. The weights start from a prior (how well a title's
+genres overlap the user's liked titles, plus its scaled rating and
+popularity) and are refined by a tiny ridge regression on the user's own
+likes and dislikes. shortlist() keeps the best few thousand, and only
+those are re-ranked by the classifier.
+retrieval_recall() compares the two-stage result with the full scan.
+"""
+
+import numpy as np
+
+from scoring import top_k
+
+RETRIEVAL_CANDIDATES = 5000  # titles the classifier re-ranks; 0 = score every unwatched title
+PRESCORE_WEIGHTS = {'genres': 1.0, 'imdb': 0.25, 'popularity': 0.25}  # prior before any ratings
+PRESCORE_REG = 1.0  # pull of the prior weights against the user's own ratings
+
+
+def prior_weights(columns, X, liked_rows, disliked_rows, weights=PRESCORE_WEIGHTS):
+    """One weight per model input column: genre overlap with liked titles, rating and popularity."""
+    w = np.zeros(len(columns))
+    genre_cols = [i for i, c in enumerate(columns) if c.startswith('genre__')]
+    if genre_cols:
+        # share of liked titles with each genre, minus the share of disliked ones
+        for rows, sign in ((liked_rows, 1.0), (disliked_rows, -1.0)):
+            if len(rows):
+                G = X[np.asarray(rows)][:, genre_cols]
+                w[genre_cols] += sign * np.asarray(G.mean(axis=0)).ravel()
+        w[genre_cols] *= weights.get('genres', 0.0)
+    for name in ('imdb', 'popularity'):
+        if name in columns:
+            w[columns.index(name)] = weights.get(name, 0.0)
+    return w
+
+
+def prescore_weights(columns, X, liked_rows, disliked_rows, weights=PRESCORE_WEIGHTS, reg=PRESCORE_REG):
+    """
+    Linear pre-score weights fitted to the user's likes (1) and dislikes (0)
+    by ridge regression shrunk towards prior_weights(), so a handful of
+    ratings leans on the prior and more ratings learn their own weights.
+    """
+    w0 = prior_weights(columns, X, liked_rows, disliked_rows, weights)
+    rows = np.concatenate([np.asarray(liked_rows, dtype=np.int64), np.asarray(disliked_rows, dtype=np.int64)])
+    if len(rows) == 0:
+        return w0
+    A = X[rows]
+    A = A.toarray() if hasattr(A, 'toarray') else np.asarray(A, dtype=np.float64)
+    A = np.hstack([A, np.ones((len(rows), 1))])  # intercept, not regularized towards anything
+    y = np.concatenate([np.ones(len(liked_rows)), np.zeros(len(disliked_rows))]) - 0.5
+    penalty = reg * np.eye(A.shape[1])
+    penalty[-1, -1] = 0.0
+    prior = np.append(w0, 0.0)
+    w = np.linalg.solve(A.T @ A + penalty + 1e-9 * np.eye(A.shape[1]), A.T @ y + penalty @ prior)
+    return w[:-1]
+
+
+def prescore(X, w):
+    # score of every catalog row; X is the (sparse or dense) model input matrix
+    return np.asarray(X @ w, dtype=np.float64).ravel()
+
+
+def shortlist(X, columns, candidate_rows, liked_rows, disliked_rows, n=RETRIEVAL_CANDIDATES,
+              weights=PRESCORE_WEIGHTS):
+    """The n best candidate rows by pre-score, ascending; all of them if n is 0 or large enough."""
+    candidate_rows = np.asarray(candidate_rows)
+    if not n or len(candidate_rows) <= n:
+        return candidate_rows
+    scores = prescore(X, prescore_weights(columns, X, liked_rows, disliked_rows, weights))
+    return np.sort(top_k(scores[candidate_rows], n, ids=candidate_rows))
+
+
+def retrieval_recall(full, two_stage, key='prob_like'):
+    """
+    Share of the full-scan top-k that the two-stage list matches. A title
+    counts when it scores at least the full scan's k-th score, so titles
+    tied at the cutoff (common with a single tree) are interchangeable.
+    """
+    if not full:
+        return 1.0
+    cutoff = min(r[key] for r in full)
+    hits = sum(1 for r in two_stage if r[key] >= cutoff)
+    return min(hits, len(full)) / len(full)
@@ -0,0 +1,201 @@
+"""
+scoring.py
+Candidate scoring helpers for recommend().
+
+Top-N selection works on the raw score vector: argpartition finds the k
+best in O(n), and only those k are sorted. TopK keeps a bounded heap for
+when scores arrive in chunks. Both order by descending score, breaking
+ties by ascending candidate id, so chunked and one-shot scoring agree.
+
+score_candidates() streams candidate rows through the classifier in blocks,
+optionally across a process pool, and only ever holds one block of
+probabilities per worker plus the running top k. A ScoringPool keeps those
+workers alive between requests with the catalog matrix attached once
+through shared memory (see shared_matrix.py).
+"""
+
+import heapq
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from shared_matrix import SharedMatrix, attach
+
+
+def top_k(scores, k, ids=None):
+    """
+    Positions (or ids, if given) of the k highest scores, best first.
+    Equal scores keep their original order.
+    """
+    scores = np.asarray(scores)
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n:
+        kth = np.argpartition(-scores, k - 1)[:k]
+        cutoff = scores[kth].min()
+        # argpartition picks arbitrarily among ties at the cutoff; take the earliest
+        above = np.flatnonzero(scores > cutoff)
+        at_cutoff = np.flatnonzero(scores == cutoff)[:k - len(above)]
+        picked = np.concatenate([above, at_cutoff])
+    else:
+        picked = np.arange(n)
+    picked = picked[np.lexsort((picked, -scores[picked]))]
+    return picked if ids is None else np.asarray(ids)[picked]
+
+
+class TopK:
+    """Bounded min-heap that keeps the k best (score, id) pairs across chunks."""
+
+    def __init__(self, k):
+        self.k = k
+        self.heap = []  # (score, -id): the worst entry, and on ties the later id, sits on top
+
+    def push(self, scores, ids):
+        # only a chunk's own top k can enter the global top k
+        scores = np.asarray(scores)
+        ids = np.asarray(ids)
+        if np.all(ids[1:] > ids[:-1]):
+            order = top_k(scores, self.k)  # ties by position are ties by id
+        else:
+            order = np.lexsort((ids, -scores))[:self.k]
+        for pos in order:
+            item = (float(scores[pos]), -int(ids[pos]))
+            if len(self.heap) < self.k:
+                heapq.heappush(self.heap, item)
+            elif item > self.heap[0]:
+                heapq.heapreplace(self.heap, item)
+            else:
+                break  # chunk results are sorted, the rest cannot qualify
+
+    def merge(self, other):
+        for score, neg_id in other.heap:
+            self.push([score], [-neg_id])
+
+    def result(self):
+        """(ids, scores) arrays, best first."""
+        best = sorted(self.heap, reverse=True)
+        ids = np.array([-neg_id for _, neg_id in best], dtype=np.int64)
+        scores = np.array([score for score, _ in best], dtype=np.float64)
+        return ids, scores
+
+
+def like_probability(clf, X):
+    """Probability of "like" (class 1) for each row of X, robust to odd classifiers."""
+    n = X.shape[0]
+    if not hasattr(clf, 'predict_proba'):
+        # classifier doesn't support predict_proba -> fallback to predict
+        return clf.predict(X).astype(float)
+    classes = getattr(clf, "classes_", None)
+    if classes is None:
+        # Fallback: if no classes_ attribute, use predict output
+        return clf.predict(X).astype(float)
+    if 1 not in classes:
+        # single-class case: trained only on 0 -> never liked, only on 1 -> always liked
+        return np.ones(n) if classes[0] == 1 else np.zeros(n)
+    proba = clf.predict_proba(X)  # shape (n_samples, n_classes)
+    idx1 = int(list(classes).index(1))
+    if proba.shape[1] <= idx1:
+        # should not normally happen, but handle gracefully
+        return np.zeros(n)
+    return proba[:, idx1]
+
+
+def _score_rows(clf, X, rows, k):
+    # local top k of one block of candidate rows
+    prob = like_probability(clf, X[rows])
+    best = top_k(prob, k)
+    return rows[best], prob[best]
+
+
+# per-process state for pool workers, set once by _init_worker
+_worker = {}
+
+
+def _init_worker(matrix_spec):
+    X, segments = attach(matrix_spec)
+    _worker.update(X=X, segments=segments, clf_key=None, clf=None)
+
+
+def _score_block(task):
+    clf_key, clf_spec, rows_spec, start, end, k = task
+    w = _worker
+    if w['clf_key'] != clf_key:
+        # unpickle each request's classifier once per worker, not once per block
+        clf_bytes, segments = attach(clf_spec)
+        try:
+            w['clf'] = pickle.loads(clf_bytes)
+        finally:
+            del clf_bytes
+            for shm in segments:
+                shm.close()
+        w['clf_key'] = clf_key
+    rows, segments = attach(rows_spec)
+    try:
+        ids, prob = _score_rows(w['clf'], w['X'], rows[start:end], k)
+        return ids.copy(), prob
+    finally:
+        del rows
+        for shm in segments:
+            shm.close()
+
+
+class ScoringPool:
+    """
+    Long-lived process pool for score_candidates(). The catalog matrix is
+    published once and attached by each worker at startup. A request
+    publishes its pickled classifier and candidate rows the same way, so
+    each task only carries their specs and its block bounds.
+    """
+
+    def __init__(self, X, workers):
+        self.workers = workers
+        self.shared = SharedMatrix(X)
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                        initargs=(self.shared.spec,))
+        self.requests = 0
+
+    def score(self, clf, rows, k, block_size):
+        rows = np.asarray(rows, dtype=np.int64)
+        bounds = [(s, min(s + block_size, len(rows))) for s in range(0, len(rows), block_size)]
+        self.requests += 1
+        clf_bytes = np.frombuffer(pickle.dumps(clf, protocol=pickle.HIGHEST_PROTOCOL), dtype=np.uint8)
+        best = TopK(k)
+        with SharedMatrix(clf_bytes) as shared_clf, SharedMatrix(rows) as shared_rows:
+            tasks = [(self.requests, shared_clf.spec, shared_rows.spec, start, end, k) for start, end in bounds]
+            for ids, prob in self.pool.map(_score_block, tasks):
+                best.push(prob, ids)
+        return best.result()
+
+    def close(self):
+        self.pool.shutdown()
+        self.shared.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def score_candidates(clf, X, rows, k, block_size=200_000, workers=1, pool=None):
+    """
+    Score the catalog rows `rows` of X in blocks of block_size and return
+    (rows, probabilities) of the k best, best first. With a ScoringPool (or
+    workers > 1, which starts a temporary one) the blocks are spread over
+    worker processes that read X from shared memory.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    block_size = max(1, int(block_size))
+    if pool is not None:
+        return pool.score(clf, rows, k, block_size)
+    if workers > 1 and len(rows) > block_size:
+        with ScoringPool(X, min(workers, -(-len(rows) // block_size))) as tmp_pool:
+            return tmp_pool.score(clf, rows, k, block_size)
+    best = TopK(k)
+    for start in range(0, len(rows), block_size):
+        ids, prob = _score_rows(clf, X, rows[start:start + block_size], k)
+        best.push(prob, ids)
+    return best.result()
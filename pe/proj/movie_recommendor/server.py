@@ -0,0 +1,203 @@
+"""
+server.py
+Local HTTP recommendation service (stdlib asyncio, no web framework).
+
+    python app.py serve --port 8765
+
+Endpoints (JSON responses):
+    GET  /search?q=<text>&k=10                      title search (trigram index, fuzzy fallback)
+    POST /rate       {"user_id", "title", "value"}  store a like (1) / dislike (0)
+    GET  /recommend?user_id=<id>&classifier=rf&top_n=10
+
+The catalog, feature store and title index are loaded once at startup.
+Ratings live in the multi-user SQLite store. Fitted models are kept in a
+bounded LRU cache keyed by user and classifier and reused until that
+user's ratings change. All catalog, database and model work runs on a
+thread pool, so the event loop only parses requests and writes responses.
+"""
+
+import json
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+import app
+
+MODEL_CACHE_SIZE = 128     # fitted models kept in memory
+MAX_BODY_BYTES = 1 << 20
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class RecommenderService:
+    """Catalog, indexes and a bounded per-user model cache behind the HTTP handlers."""
+
+    def __init__(self, csv_path=app.MOVIES_CSV, workers=4, model_cache_size=MODEL_CACHE_SIZE):
+        self.df = app.load_movies(csv_path)
+        self.store = app.FeatureStore.open(self.df, sparse=app.SPARSE_FEATURES)
+        self.index = app.open_title_index(self.df)
+        self.matcher = app.open_fuzzy_matcher(self.index, self.df)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.models = OrderedDict()  # (user_id, classifier) -> (ratings hash, clf)
+        self.model_cache_size = model_cache_size
+        self.models_lock = threading.Lock()
+
+    async def run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def search(self, query, k):
+        matches = app.search_movie(query, self.df, max_results=k, index=self.index)
+        fuzzy = False
+        if matches.empty:
+            matches = app.fuzzy_search(query, self.df, self.matcher, k=k)
+            fuzzy = True
+        results = []
+        for _, row in matches.iterrows():
+            results.append({
+                'title': row['title'],
+                'year': int(row['year']) if 'year' in row else None,
+                'imdb': round(float(row['imdb']), 2) if 'imdb' in row else None,
+            })
+        return {'query': query, 'fuzzy': fuzzy, 'results': results}
+
+    def rate(self, user_id, title, value):
+        if title not in self.store.row_of:
+            raise HttpError(404, f"unknown title: {title}")
+        ratings = app.load_ratings(user_id)
+        app.save_rating(ratings, title, value, user_id=user_id)
+        return {'user_id': user_id, 'title': title, 'value': value, 'ratings': len(ratings)}
+
+    def model_for(self, user_id, ratings, classifier):
+        key = (user_id, classifier)
+        # tuned settings (model_params.json) change the model as much as new ratings do
+        ratings_hash = f"{app.settings_fingerprint(classifier)}:{app.ratings_fingerprint(ratings)}"
+        with self.models_lock:
+            cached = self.models.get(key)
+            if cached is not None and cached[0] == ratings_hash:
+                self.models.move_to_end(key)
+                return cached[1], True
+        # fit outside the lock so other users' requests are not held up
+        clf, _, _ = app.train_model(self.store, ratings, classifier=classifier)
+        if clf is not None:
+            with self.models_lock:
+                self.models[key] = (ratings_hash, clf)
+                self.models.move_to_end(key)
+                while len(self.models) > self.model_cache_size:
+                    self.models.popitem(last=False)
+        return clf, False
+
+    def recommend(self, user_id, classifier, top_n):
+        started = time.perf_counter()
+        ratings = app.load_ratings(user_id)
+        clf, cached = self.model_for(user_id, ratings, classifier)
+        if clf is None:
+            raise HttpError(400, f"user {user_id} has no ratings in this catalog")
+        recs = app.recommend(self.df, clf, self.store, ratings, top_n=top_n)
+        return {'user_id': user_id, 'classifier': classifier, 'model_cached': cached,
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 1), 'recommendations': recs}
+
+    async def handle(self, method, target, body):
+        url = urlsplit(target)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if url.path == '/search':
+            if method != 'GET':
+                raise HttpError(405, "use GET")
+            return await self.run(self.search, params.get('q', ''), _int(params.get('k', 10), 'k'))
+        if url.path == '/rate':
+            if method != 'POST':
+                raise HttpError(405, "use POST")
+            try:
+                data = json.loads(body or b'{}')
+                user_id, title, value = str(data['user_id']), data['title'], int(data['value'])
+            except (ValueError, KeyError, TypeError):
+                raise HttpError(400, 'expected JSON {"user_id", "title", "value"}')
+            if value not in (0, 1):
+                raise HttpError(400, "value must be 0 or 1")
+            return await self.run(self.rate, user_id, title, value)
+        if url.path == '/recommend':
+            if method != 'GET':
+                raise HttpError(405, "use GET")
+            if 'user_id' not in params:
+                raise HttpError(400, "user_id is required")
+            classifier = params.get('classifier', 'rf')
+            if classifier not in app.CLASSIFIER_NAMES:
+                raise HttpError(400, f"classifier must be one of {sorted(app.CLASSIFIER_NAMES)}")
+            top_n = _int(params.get('top_n', app.RECOMMEND_TOP_N), 'top_n')
+            return await self.run(self.recommend, params['user_id'], classifier, top_n)
+        raise HttpError(404, f"no such endpoint: {url.path}")
+
+
+def _int(value, name):
+    try:
+        return max(1, int(value))
+    except ValueError:
+        raise HttpError(400, f"{name} must be an integer")
+
+
+async def _serve_connection(service, reader, writer):
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            lines = head.decode('latin-1').split("\r\n")
+            method, target, version = lines[0].split(' ', 2)
+            headers = {}
+            for line in lines[1:]:
+                if ':' in line:
+                    name, value = line.split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length', 0))
+            status, payload = 200, None
+            if length > MAX_BODY_BYTES:
+                status, payload = 413, {'error': "request body too large"}
+                body = b''
+            else:
+                body = await reader.readexactly(length) if length else b''
+            if payload is None:
+                try:
+                    payload = await service.handle(method.upper(), target, body)
+                except HttpError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except Exception as e:  # keep serving other requests
+                    status, payload = 500, {'error': f"{type(e).__name__}: {e}"}
+            data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            # an unread oversized body would be parsed as the next request, so close instead
+            keep_alive = (headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                          and status != 413)
+            writer.write(
+                f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+        pass  # client went away or sent garbage
+    finally:
+        writer.close()
+
+
+async def serve(host='127.0.0.1', port=8765, csv_path=app.MOVIES_CSV, workers=4):
+    # use the multi-user ratings store for every request
+    app.RATINGS_BACKEND = 'sqlite'
+    service = RecommenderService(csv_path, workers=workers)
+    server = await asyncio.start_server(lambda r, w: _serve_connection(service, r, w), host, port)
+    print(f"Serving {len(service.df):,} titles on http://{host}:{port} (Ctrl+C to stop)")
+    async with server:
+        await server.serve_forever()
+
+
+def run(host='127.0.0.1', port=8765, csv_path=app.MOVIES_CSV, workers=4):
+    try:
+        asyncio.run(serve(host, port, csv_path, workers))
+    except KeyboardInterrupt:
+        print("Stopped.")
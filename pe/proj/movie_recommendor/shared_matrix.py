@@ -0,0 +1,89 @@
+"""
+shared_matrix.py
+Publish the catalog feature matrix once for many worker processes.
+
+A SharedMatrix turns a dense array or CSR matrix into a small picklable
+spec. Components that are already memory-mapped .npy files (the feature
+store's on-disk cache) are referenced by path and offset; anything else is
+copied once into multiprocessing.shared_memory. attach() rebuilds the
+matrix in a worker as zero-copy views, so sending the spec costs the same
+whether the matrix has a thousand rows or ten million.
+"""
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from lazy import LazyModule
+
+sp = LazyModule('scipy.sparse')
+
+
+def _backing_file(arr):
+    # (path, byte offset) if arr is a contiguous view into a np.memmap'd file
+    base = arr
+    while isinstance(base, np.ndarray) and not isinstance(base, np.memmap):
+        base = base.base  # ends at None, a memmap, or a non-array buffer such as bytes
+    if not isinstance(base, np.memmap) or not base.filename or not arr.flags['C_CONTIGUOUS']:
+        return None
+    return base.filename, base.offset + (arr.ctypes.data - base.ctypes.data)
+
+
+def _publish_array(arr, segments):
+    backing = _backing_file(arr) if isinstance(arr, np.ndarray) else None
+    if backing is not None:
+        return ('file', backing[0], arr.dtype.str, arr.shape, backing[1])
+    arr = np.ascontiguousarray(arr)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    segments.append(shm)
+    return ('shm', shm.name, arr.dtype.str, arr.shape, 0)
+
+
+def _attach_array(spec, segments):
+    kind, where, dtype, shape, offset = spec
+    if kind == 'file':
+        return np.memmap(where, dtype=np.dtype(dtype), mode='r', shape=tuple(shape), offset=offset)
+    # pool workers share the publisher's resource tracker, so attaching here
+    # does not make this process responsible for unlinking the segment
+    shm = shared_memory.SharedMemory(name=where)
+    segments.append(shm)  # the view is only valid while the segment stays open
+    return np.ndarray(tuple(shape), dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+class SharedMatrix:
+    """A matrix published for zero-copy access from other processes."""
+
+    def __init__(self, X):
+        self.segments = []
+        if sp.issparse(X):
+            X = sp.csr_matrix(X)
+            parts = {'data': X.data, 'indices': X.indices, 'indptr': X.indptr}
+            self.spec = ('csr', X.shape, {k: _publish_array(v, self.segments) for k, v in parts.items()})
+        else:
+            self.spec = ('dense', np.shape(X), {'data': _publish_array(np.asarray(X), self.segments)})
+
+    def close(self):
+        """Release and unlink the shared-memory segments this process created."""
+        for shm in self.segments:
+            shm.close()
+            shm.unlink()
+        self.segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(spec):
+    """Rebuild a published matrix from its spec; returns (matrix, open segments)."""
+    kind, shape, parts = spec
+    segments = []
+    arrays = {k: _attach_array(v, segments) for k, v in parts.items()}
+    if kind == 'csr':
+        X = sp.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=shape, copy=False)
+    else:
+        X = arrays['data']
+    return X, segments
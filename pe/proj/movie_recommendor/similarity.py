@@ -0,0 +1,145 @@
+"""
+similarity.py
+"More like this" lookups over the catalog feature vectors.
+
+Every title's feature row (scaled rating, year, popularity and genre
+flags) is compared by cosine similarity. An inverted-file (IVF) index
+groups the rows around spherical k-means centroids trained on a sample of
+the catalog; a query only scores the rows of the n_probe lists whose
+centroids are closest to it, so lookups touch a small fraction of the
+catalog and need no per-user training. The index is persisted next to the
+catalog cache.
+"""
+
+import numpy as np
+
+from lazy import LazyModule
+
+import catalog_cache
+from scoring import top_k
+
+sp = LazyModule('scipy.sparse')
+
+SIMILARITY_VERSION = 1
+N_PROBE = 8                 # lists scanned per query; more = better recall, slower
+TRAIN_SAMPLE = 50_000       # rows used to fit the centroids
+KMEANS_ITERS = 15
+BUILD_BLOCK_ROWS = 100_000  # rows assigned to lists per batch
+
+
+def _dense(X, start, end):
+    block = X[start:end]
+    return block.toarray() if sp.issparse(block) else np.asarray(block, dtype=np.float64)
+
+
+def _row_norms(X):
+    if sp.issparse(X):
+        norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+    else:
+        norms = np.linalg.norm(np.asarray(X, dtype=np.float64), axis=1)
+    norms = norms.astype(np.float32)
+    norms[norms == 0] = 1.0  # all-zero rows score 0 against everything
+    return norms
+
+
+def _unit(V):
+    norms = np.linalg.norm(V, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return V / norms
+
+
+def spherical_kmeans(V, n_lists, iters=KMEANS_ITERS, seed=0):
+    """Unit-length centroids for the unit rows of V (k-means on cosine similarity)."""
+    rng = np.random.default_rng(seed)
+    centroids = V[rng.choice(len(V), size=n_lists, replace=False)]
+    for _ in range(iters):
+        assign = np.argmax(V @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, V)
+        counts = np.bincount(assign, minlength=n_lists)
+        empty = counts == 0
+        if empty.any():
+            # re-seed empty lists from random rows so every list stays in use
+            sums[empty] = V[rng.choice(len(V), size=int(empty.sum()), replace=False)]
+        centroids = _unit(sums)
+    return centroids
+
+
+class SimilarityIndex:
+    """IVF index of catalog rows for approximate cosine nearest neighbours."""
+
+    def __init__(self, centroids, offsets, members, norms):
+        self.centroids = centroids  # (n_lists, n_features), unit length
+        self.offsets = offsets      # members[offsets[i]:offsets[i+1]] belong to list i
+        self.members = members      # catalog rows, ascending within each list
+        self.norms = norms          # L2 norm of every catalog row
+
+    @classmethod
+    def build(cls, X, n_lists=None, seed=0):
+        n = X.shape[0]
+        if n_lists is None:
+            n_lists = int(np.sqrt(n))
+        n_lists = max(1, min(n_lists, n))
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(n, size=min(n, TRAIN_SAMPLE), replace=False))
+        V = _unit(X[sample].toarray() if sp.issparse(X) else np.asarray(X, dtype=np.float64)[sample])
+        centroids = spherical_kmeans(V, min(n_lists, len(V)), seed=seed)
+
+        assign = np.empty(n, dtype=np.int32)
+        for start in range(0, n, BUILD_BLOCK_ROWS):
+            end = min(start + BUILD_BLOCK_ROWS, n)
+            assign[start:end] = np.argmax(_dense(X, start, end) @ centroids.T, axis=1)
+        members = np.argsort(assign, kind='stable').astype(np.int64)
+        offsets = np.searchsorted(assign[members], np.arange(len(centroids) + 1)).astype(np.int64)
+        return cls(centroids.astype(np.float32), offsets, members, _row_norms(X))
+
+    @classmethod
+    def open(cls, X, cache_dir=None, key=None):
+        """Load the index saved for this feature set, or build and save it."""
+        if key:
+            key = f"{key}:{SIMILARITY_VERSION}"
+            found = catalog_cache.load_arrays(cache_dir, key, name='similarity')
+            if found is not None:
+                arrays, _ = found
+                return cls(arrays['centroids'], arrays['offsets'], arrays['members'], arrays['norms'])
+        index = cls.build(X)
+        if key:
+            try:
+                index.save(cache_dir, key)
+            except OSError as e:
+                print(f"Warning: could not write similarity index ({e}).")
+        return index
+
+    def save(self, cache_dir, key):
+        arrays = {'centroids': self.centroids, 'offsets': self.offsets,
+                  'members': self.members, 'norms': self.norms}
+        catalog_cache.save_arrays(arrays, cache_dir, key, name='similarity')
+
+    def __len__(self):
+        return len(self.norms)
+
+    def query_vector(self, X, rows):
+        # mean direction of the given rows, as a unit vector
+        V = X[np.asarray(rows)]
+        V = V.toarray() if sp.issparse(V) else np.asarray(V, dtype=np.float64)
+        return _unit((V / self.norms[np.asarray(rows)][:, None]).mean(axis=0))
+
+    def candidates(self, q, n_probe=N_PROBE):
+        """Catalog rows (ascending) in the n_probe lists closest to q."""
+        lists = top_k(self.centroids @ q, n_probe)
+        return np.sort(np.concatenate([self.members[self.offsets[i]:self.offsets[i + 1]] for i in lists]))
+
+    def search(self, X, rows, k=10, n_probe=N_PROBE, exclude=None):
+        """
+        The k rows most similar to the given rows, as (rows, cosine similarities).
+        The given rows and `exclude` are never returned. n_probe=None scans every row.
+        """
+        q = self.query_vector(X, rows)
+        cand = np.arange(len(self)) if n_probe is None else self.candidates(q, n_probe)
+        skip = np.asarray(rows) if exclude is None else np.union1d(rows, exclude)
+        cand = cand[~np.isin(cand, skip)]
+        if len(cand) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        sims = np.asarray(X[cand] @ q).ravel() / self.norms[cand]
+        picked = top_k(sims, k)
+        return cand[picked], sims[picked]
@@ -0,0 +1,140 @@
+"""
+synth.py
+Synthetic IMDb-style catalogs and rating sets for benchmarks and tests.
+
+    python app.py synth --rows 1000000 --out bench/imdb_1m.csv --users 1000
+
+Catalogs use the imdb.csv schema (id,title,type,genres,averageRating,
+numVotes,releaseYear) and are written in chunks, so 1e7 rows never sit in
+memory at once. The distributions follow the real title.basics /
+title.ratings dumps loosely: a mix of title types dominated by movies and
+shorts, one to three genres with Drama/Comedy/Documentary most common,
+log-normal vote counts with a long tail, ratings centred near 6.2 with
+unrated titles missing, and release years skewed towards recent decades.
+Titles repeat now and then across chunks, as remakes do; the loader keeps
+the first.
+
+Rating sets are drawn from a catalog: each user has a taste over genres,
+rates mostly popular titles and likes those matching their taste and
+with a good rating.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+CHUNK_ROWS = 1_000_000
+
+TYPES = ['movie', 'short', 'tvEpisode', 'tvSeries', 'tvMovie', 'video', 'tvMiniSeries']
+TYPE_WEIGHTS = [0.45, 0.15, 0.2, 0.08, 0.05, 0.05, 0.02]
+# relative genre frequency, roughly as in the IMDb dumps
+GENRES = {
+    'Drama': 30, 'Comedy': 18, 'Documentary': 12, 'Romance': 6, 'Action': 6, 'Thriller': 5,
+    'Crime': 5, 'Horror': 5, 'Adventure': 4, 'Family': 4, 'Animation': 4, 'Music': 3,
+    'Mystery': 3, 'Fantasy': 3, 'Biography': 3, 'Sci-Fi': 2, 'History': 2, 'Short': 2,
+    'War': 1, 'Musical': 1, 'Sport': 1, 'Western': 1, 'Adult': 1, 'Film-Noir': 0.3,
+}
+GENRE_COUNT_WEIGHTS = [0.02, 0.48, 0.3, 0.2]  # P(0, 1, 2, 3 genres); 0 is written as \N
+WORDS = """
+the a of and in night day love man woman girl boy city house world war dark light last first
+blood star king queen lost dead life time secret story road river sea home heart fire ice
+black white red blue golden silent wild broken little big long new old final great true hidden
+dream shadow ghost killer game summer winter spring autumn morning midnight return rise fall
+song dance moon sun sky storm island mountain forest garden street bridge station hotel school
+brother sister mother father son daughter family friend stranger hunter soldier doctor angel
+devil saint thief lady lord prince princess captain detective witness promise journey escape
+revenge legend mystery murder kiss letter voice memory edge end beginning paradise empire
+""".split()
+
+
+def _titles(rng, n, year):
+    lengths = rng.choice([1, 2, 3, 4], size=n, p=[0.1, 0.3, 0.35, 0.25])
+    words = np.asarray(WORDS, dtype=object)[rng.integers(0, len(WORDS), size=(n, 4))]
+    titles = pd.Series([' '.join(w[:k]).title() for w, k in zip(words, lengths)])
+    # repeated titles are told apart by year, as IMDb does, then numbered like sequels
+    again = titles.duplicated().to_numpy()
+    titles[again] = titles[again] + ' (' + pd.Series(year[again], index=titles.index[again]).astype(str) + ')'
+    repeat = titles.groupby(titles).cumcount().to_numpy()
+    return np.where(repeat > 0, titles + ' ' + (repeat + 1).astype(str), titles)
+
+
+def _genres(rng, n):
+    names = np.array(list(GENRES), dtype=object)
+    p = np.array(list(GENRES.values()), dtype=float)
+    p /= p.sum()
+    counts = rng.choice(len(GENRE_COUNT_WEIGHTS), size=n, p=GENRE_COUNT_WEIGHTS)
+    # Gumbel top-k draws up to three distinct genres per row in one shot
+    keys = np.log(p) - np.log(-np.log(rng.random((n, len(p)))))
+    top3 = np.argsort(-keys, axis=1)[:, :3]
+    alpha_rank = np.argsort(np.argsort(names))
+    out = np.empty(n, dtype=object)
+    for k in range(len(GENRE_COUNT_WEIGHTS)):
+        rows = np.flatnonzero(counts == k)
+        if k == 0:
+            out[rows] = '\\N'
+            continue
+        picked = top3[rows, :k]
+        picked = np.take_along_axis(picked, np.argsort(alpha_rank[picked], axis=1), axis=1)  # alphabetical, as IMDb
+        out[rows] = [','.join(names[r]) for r in picked]
+    return out
+
+
+def catalog_chunk(rng, start, n):
+    """One DataFrame of n synthetic titles with ids starting at `start`."""
+    votes = np.minimum(rng.lognormal(mean=3.0, sigma=1.9, size=n), 3_000_000).astype(np.int64) + 5
+    rating = np.clip(rng.normal(6.2, 1.3, size=n) + 0.15 * np.log10(votes), 1.0, 10.0).round(1)
+    unrated = rng.random(n) < 0.1
+    year = np.clip(2025 - rng.exponential(25, size=n), 1894, 2025).astype(np.int64)
+    return pd.DataFrame({
+        'id': [f"tt{i:08d}" for i in range(start, start + n)],
+        'title': _titles(rng, n, year),
+        'type': np.asarray(TYPES, dtype=object)[rng.choice(len(TYPES), size=n, p=TYPE_WEIGHTS)],
+        'genres': _genres(rng, n),
+        'averageRating': np.where(unrated, np.nan, rating),
+        'numVotes': np.where(unrated, np.nan, votes),
+        'releaseYear': year,
+    })
+
+
+def generate_catalog(rows, path, seed=0, chunk_rows=CHUNK_ROWS):
+    """Write a synthetic imdb.csv with `rows` titles (of every type) to path."""
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    for start in range(0, rows, chunk_rows):
+        chunk = catalog_chunk(rng, start, min(chunk_rows, rows - start))
+        chunk.to_csv(tmp, mode='w' if start == 0 else 'a', header=start == 0, index=False,
+                     na_rep='\\N', float_format='%g')
+    os.replace(tmp, path)
+    return path
+
+
+def generate_ratings(df, users, per_user=50, seed=0):
+    """
+    DataFrame of (user_id, title, value) for `users` synthetic users, drawn
+    from a loaded catalog (the frame returned by load_movies()).
+    """
+    rng = np.random.default_rng(seed)
+    names = list(GENRES)
+    # genre membership per distinct genre string, expanded by category code
+    genres = pd.Categorical(df['genres'].astype(str))
+    per_cat = np.array([[n in {g.strip() for g in c.split(',')} for n in names] for c in genres.categories],
+                       dtype=np.float32)
+    has = per_cat[genres.codes]
+    votes = df['numVotes'].to_numpy(dtype=np.float64) if 'numVotes' in df.columns else np.ones(len(df))
+    weight = np.power(votes + 1, 0.7)
+    weight /= weight.sum()
+    imdb = df['imdb'].to_numpy(dtype=np.float64) if 'imdb' in df.columns else np.full(len(df), 6.0)
+    titles = df['title'].to_numpy()
+    per_user = min(per_user, len(df))
+
+    records = []
+    for u in range(users):
+        taste = rng.dirichlet(np.full(len(names), 0.3))
+        rows = rng.choice(len(df), size=per_user, replace=False, p=weight)
+        affinity = has[rows] @ taste * len(names) / 3
+        p_like = 1 / (1 + np.exp(-(2.0 * (affinity - 0.5) + 0.8 * (imdb[rows] - 6.2))))
+        liked = (rng.random(per_user) < p_like).astype(int)
+        records.extend(zip([f"user{u:06d}"] * per_user, titles[rows], liked))
+    return pd.DataFrame(records, columns=['user_id', 'title', 'value'])
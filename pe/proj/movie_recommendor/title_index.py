@@ -0,0 +1,160 @@
+"""
+title_index.py
+Inverted trigram index over normalized movie titles.
+
+Every lowercase title is broken into its overlapping 3-character grams and
+each gram keeps a sorted posting list of the catalog rows that contain it.
+A substring query intersects the posting lists of its own grams (rarest
+first) and only verifies the few surviving rows, instead of scanning the
+whole title column. The index is built with vectorized numpy ops and
+persisted next to the catalog cache.
+"""
+
+import numpy as np
+
+import catalog_cache
+
+INDEX_VERSION = 1
+BUILD_CHUNK_TITLES = 500_000  # titles gram-ified per batch while building
+
+
+def normalize(title):
+    return str(title).lower().strip().replace('\x00', '')
+
+
+def _gram_codes(codes):
+    # pack three consecutive code points (each < 2**21) into one uint64
+    c = codes.astype(np.uint64)
+    return (c[:-2] << np.uint64(42)) | (c[1:-1] << np.uint64(21)) | c[2:]
+
+
+def query_grams(text):
+    if len(text) < 3:
+        return np.empty(0, dtype=np.uint64)
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    return np.unique(_gram_codes(codes))
+
+
+def _chunk_pairs(norm, first_row):
+    # (gram, row) pairs for one batch of titles, deduplicated, sorted by gram
+    text = '\x00'.join(norm) + '\x00'
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    lengths = np.fromiter((len(t) + 1 for t in norm), dtype=np.int64, count=len(norm))
+    rows = np.repeat(np.arange(first_row, first_row + len(norm), dtype=np.int32), lengths)
+    if len(codes) < 3:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int32)
+    grams = _gram_codes(codes)
+    # drop grams that straddle the separator between two titles
+    valid = (codes[:-2] != 0) & (codes[1:-1] != 0) & (codes[2:] != 0)
+    grams, rows = grams[valid], rows[:-2][valid]
+    order = np.lexsort((rows, grams))
+    grams, rows = grams[order], rows[order]
+    keep = np.ones(len(grams), dtype=bool)
+    keep[1:] = (grams[1:] != grams[:-1]) | (rows[1:] != rows[:-1])
+    return grams[keep], rows[keep]
+
+
+class TitleIndex:
+    """Trigram -> posting list index for substring title search."""
+
+    def __init__(self, titles, grams, offsets, postings, norm=None):
+        self.titles = titles
+        self.norm = norm if norm is not None else [normalize(t) for t in titles]
+        self.grams = grams          # sorted unique gram codes
+        self.offsets = offsets      # postings[offsets[i]:offsets[i+1]] belong to grams[i]
+        self.postings = postings    # catalog row ids, ascending within each gram
+
+    @classmethod
+    def build(cls, titles):
+        titles = list(titles)
+        norm = [normalize(t) for t in titles]
+        all_grams, all_rows = [], []
+        for start in range(0, len(norm), BUILD_CHUNK_TITLES):
+            g, r = _chunk_pairs(norm[start:start + BUILD_CHUNK_TITLES], start)
+            all_grams.append(g)
+            all_rows.append(r)
+        grams = np.concatenate(all_grams) if all_grams else np.empty(0, dtype=np.uint64)
+        rows = np.concatenate(all_rows) if all_rows else np.empty(0, dtype=np.int32)
+        if len(all_grams) > 1:
+            # stable sort keeps rows ascending within a gram across batches
+            order = np.argsort(grams, kind='stable')
+            grams, rows = grams[order], rows[order]
+        unique, starts = np.unique(grams, return_index=True)
+        offsets = np.append(starts, len(grams)).astype(np.int64)
+        return cls(titles, unique, offsets, rows, norm=norm)
+
+    @classmethod
+    def open(cls, titles, cache_dir=None, key=None):
+        """Load the index saved for this catalog key, or build and save it."""
+        if key:
+            key = f"{key}:{INDEX_VERSION}"
+            found = catalog_cache.load_arrays(cache_dir, key, name='title_index')
+            if found is not None:
+                arrays, _ = found
+                return cls(list(titles), arrays['grams'], arrays['offsets'], arrays['postings'])
+        index = cls.build(titles)
+        if key:
+            try:
+                index.save(cache_dir, key)
+            except OSError as e:
+                print(f"Warning: could not write title index ({e}).")
+        return index
+
+    def save(self, cache_dir, key):
+        arrays = {'grams': self.grams, 'offsets': self.offsets, 'postings': self.postings}
+        catalog_cache.save_arrays(arrays, cache_dir, key, name='title_index')
+
+    def __len__(self):
+        return len(self.titles)
+
+    def posting(self, gram):
+        i = np.searchsorted(self.grams, gram)
+        if i >= len(self.grams) or self.grams[i] != gram:
+            return np.empty(0, dtype=np.int32)
+        return self.postings[self.offsets[i]:self.offsets[i + 1]]
+
+    def candidates(self, query):
+        """Rows whose title contains every trigram of the (normalized) query."""
+        grams = query_grams(query)
+        if len(grams) == 0:
+            return None  # too short to use the index
+        lists = sorted((self.posting(g) for g in grams), key=len)
+        rows = lists[0]
+        for other in lists[1:]:
+            if len(rows) == 0:
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+    def search(self, query, k=100, weights=None):
+        """
+        Row ids of the top-k titles containing query as a substring.
+        Exact matches rank first, then prefix matches, then matches at a word
+        start, then any other match; ties go to the higher weight (e.g.
+        numVotes), then to catalog order.
+        """
+        q = normalize(query)
+        rows = self.candidates(q)
+        if rows is None:
+            hits = [r for r in range(len(self.norm)) if q in self.norm[r]]
+        elif len(q) == 3:
+            hits = rows  # a single trigram's posting list is already exact
+        else:
+            hits = [r for r in rows if q in self.norm[r]]
+        if len(hits) == 0:
+            return np.empty(0, dtype=np.int64)
+        hits = np.asarray(hits, dtype=np.int64)
+
+        def match_class(title):
+            if title == q:
+                return 0
+            if title.startswith(q):
+                return 1
+            if (' ' + q) in title:
+                return 2
+            return 3
+
+        classes = np.fromiter((match_class(self.norm[r]) for r in hits), dtype=np.int8, count=len(hits))
+        w = np.zeros(len(hits)) if weights is None else -np.asarray(weights, dtype=np.float64)[hits]
+        order = np.lexsort((hits, w, classes))
+        return hits[order[:k]]
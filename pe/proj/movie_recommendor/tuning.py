@@ -0,0 +1,187 @@
+"""
+tuning.py
+Cross-validated settings search for the per-user classifiers.
+
+    python app.py tune --classifier rf --folds 5 --search random --iter 20
+    python app.py tune --classifier dt --search grid --user alice
+
+The rated titles are pulled out of the feature store once and split into
+stratified folds. Every (settings, fold) pair is one task on a process
+pool; the workers receive X, y and the fold splits once through the pool
+initializer, so a task only ships its settings and fold number. Settings
+are ranked by mean ROC AUC over the folds (accuracy is reported too), the
+built-in DEFAULT_PARAMS always among them for comparison.
+
+All results and the best settings are written to model_params.json, which
+train_model() and batch runs read; saved models are keyed by their settings, so the
+next fit uses the new ones.
+"""
+
+import os
+import json
+import time
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import app
+
+SEARCH_SPACE = {
+    'rf': {
+        'n_estimators': [50, 100, 200, 400],
+        'max_depth': [None, 4, 8, 16],
+        'min_samples_leaf': [1, 2, 4],
+        'max_features': ['sqrt', 0.5, None],
+        'class_weight': ['balanced', None],
+    },
+    'dt': {
+        'max_depth': [2, 3, 4, 6, 8, 12, None],
+        'min_samples_leaf': [1, 2, 4, 8],
+        'criterion': ['gini', 'entropy'],
+        'class_weight': ['balanced', None],
+    },
+}
+CV_FOLDS = 5
+SEARCH_ITER = 20  # settings tried by random search
+SHOW_TOP = 10     # result rows printed
+
+
+def candidates(classifier, search='random', n_iter=SEARCH_ITER, seed=0):
+    """Settings to evaluate: the defaults first, then the grid or a random sample of it."""
+    space = SEARCH_SPACE[classifier]
+    names = list(space)
+    grid = [dict(zip(names, values)) for values in itertools.product(*space.values())]
+    if search == 'random' and n_iter < len(grid):
+        rng = np.random.default_rng(seed)
+        grid = [grid[i] for i in sorted(rng.choice(len(grid), size=n_iter, replace=False))]
+    default = dict(app.DEFAULT_PARAMS.get(classifier, {}))
+    return [default] + [p for p in grid if p != default]
+
+
+def fold_splits(y, folds=CV_FOLDS, seed=0):
+    """[(train rows, test rows)] for stratified folds; fewer folds if a class is too small."""
+    from sklearn.model_selection import StratifiedKFold
+    smallest = np.bincount(y, minlength=2).min()
+    if smallest < 2:
+        raise ValueError("need at least two liked and two disliked titles to cross-validate")
+    folds = min(folds, int(smallest))
+    return list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed).split(np.zeros(len(y)), y))
+
+
+# per-process state for pool workers, set once by _init_worker
+_worker = {}
+
+
+def _init_worker(X, y, splits):
+    _worker.update(X=X, y=y, splits=splits)
+
+
+def _score_fold(task):
+    # (ROC AUC, accuracy, fit seconds) of one setting on one fold
+    from sklearn.metrics import accuracy_score, roc_auc_score
+    from scoring import like_probability
+    classifier, params, fold = task
+    X, y = _worker['X'], _worker['y']
+    train, test = _worker['splits'][fold]
+    started = time.perf_counter()
+    clf = app.fit_classifier(X[train], y[train], classifier, params)
+    seconds = time.perf_counter() - started
+    prob = like_probability(clf, X[test])
+    return roc_auc_score(y[test], prob), accuracy_score(y[test], prob >= 0.5), seconds
+
+
+def cross_validate(X, y, classifier, settings, splits, workers=1):
+    """One result per setting: {'params', 'auc', 'auc_std', 'accuracy', 'fit_s'}, best AUC first."""
+    tasks = [(classifier, params, fold) for params in settings for fold in range(len(splits))]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(X, y, splits)) as pool:
+            scores = list(pool.map(_score_fold, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+    else:
+        _init_worker(X, y, splits)
+        scores = [_score_fold(task) for task in tasks]
+
+    results = []
+    for i, params in enumerate(settings):
+        auc, acc, seconds = np.array(scores[i * len(splits):(i + 1) * len(splits)]).T
+        results.append({'params': params, 'auc': float(auc.mean()), 'auc_std': float(auc.std()),
+                        'accuracy': float(acc.mean()), 'fit_s': float(seconds.mean())})
+    # stable sort: on equal AUC the earlier setting (the defaults first) wins
+    return sorted(results, key=lambda r: -r['auc'])
+
+
+def save_params(path, classifier, results, folds, ratings):
+    """Store the best setting and the full result table under classifier, keeping other classifiers' entries."""
+    saved = {}
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            saved = {}  # rewritten below
+    saved[classifier] = {
+        'params': results[0]['params'],
+        'auc': results[0]['auc'],
+        'folds': folds,
+        'ratings': len(ratings),
+        'ratings_hash': app.ratings_fingerprint(ratings),
+        'tuned': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'results': results,
+    }
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(saved, f, indent=2)
+    os.replace(tmp, path)
+
+
+def print_results(results, default, top=SHOW_TOP):
+    header = f"{'rank':>4}  {'AUC':>6} {'± std':>6} {'acc':>6} {'fit s':>7}  settings"
+    print(header)
+    print('-' * len(header))
+    for rank, r in enumerate(results, 1):
+        if rank > top and r['params'] != default:
+            continue
+        mark = '  (built-in default)' if r['params'] == default else ''
+        print(f"{rank:>4}  {r['auc']:>6.3f} {r['auc_std']:>6.3f} {r['accuracy']:>6.3f} {r['fit_s']:>7.3f}  "
+              f"{json.dumps(r['params'])}{mark}")
+
+
+def run_tune(classifier='rf', csv_path=app.MOVIES_CSV, user_id=None, folds=CV_FOLDS, search='random',
+             n_iter=SEARCH_ITER, workers=1, seed=0, out=app.MODEL_PARAMS_FILE, save=True):
+    """Cross-validate classifier settings on one user's ratings and save the best."""
+    ratings = app.load_ratings(user_id)
+    df = app.load_movies(csv_path)
+    store = app.FeatureStore.open(df)
+    X, y = app.training_data(store, ratings)
+    if X is None:
+        print("No rated movies found in the catalog. Rate some movies first.")
+        return None
+    try:
+        splits = fold_splits(y, folds, seed)
+    except ValueError as e:
+        print(f"Error: {e} (have {int(y.sum())} liked, {int(len(y) - y.sum())} disliked).")
+        return None
+    if len(splits) < folds:
+        print(f"Note: using {len(splits)} folds; the smaller class has only {len(splits)} titles.")
+
+    settings = candidates(classifier, search, n_iter, seed)
+    default = settings[0]
+    print(f"Cross-validating {len(settings)} {app.CLASSIFIER_NAMES[classifier]} settings x {len(splits)} folds "
+          f"on {len(y)} ratings with {workers} worker(s) ...")
+    started = time.perf_counter()
+    results = cross_validate(X, y, classifier, settings, splits, workers=workers)
+    print(f"Done in {time.perf_counter() - started:.1f}s.\n")
+    print_results(results, default)
+
+    best = results[0]
+    base = next(r for r in results if r['params'] == default)
+    print(f"\nBest: AUC {best['auc']:.3f} vs {base['auc']:.3f} for the built-in defaults.")
+    if save:
+        try:
+            save_params(out, classifier, results, len(splits), ratings)
+            used = " train_model() uses them from now on." if os.path.abspath(out) == os.path.abspath(app.MODEL_PARAMS_FILE) else ''
+            print(f"Saved the chosen settings to {out}.{used}")
+        except OSError as e:
+            print(f"Warning: could not write {out} ({e}).")
+    return results